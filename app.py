@@ -1,344 +1,19 @@
+import logging
+import multiprocessing
 import os
-import xml.etree.ElementTree as ET
-from datetime import datetime, timedelta
+import queue
+import threading
+import time
 import tkinter as tk
-from tkinter import filedialog, messagebox
-
-# ---------------- FUNÇÕES ----------------
-
-
-def limpar_icms_c100_e_c190(linha):
-    campos = linha.strip().split("|")
-
-    try:
-        if campos[1] == "C100":
-            # Garante que tem pelo menos 35 campos
-            while len(campos) < 35:
-                campos.append("")
-            
-            campos[21] = "0,00"  # VL_BC_ICMS
-            campos[22] = "0,00"  # VL_ICMS
-            campos[23] = "0,00"  # VL_BC_ICMS_ST
-            campos[24] = "0,00"  # VL_ICMS_ST
-            campos[25] = "0,00"  # VL_IPI
-            campos[26] = "0,00"  # VL_PIS
-            campos[27] = "0,00"  # VL_COFINS
-            campos[28] = "0,00"  # VL_PIS_ST
-            campos[29] = "0,00"  # VL_COFINS_ST
-
-            print(f"[INFO] C100 zerado com sucesso: {linha.strip()}")
-
-        elif campos[1] == "C190":
-            # Garante que tem pelo menos 20 campos
-            while len(campos) < 23:
-                campos.append("")
-
-            # Checando valor original da ALIQ_ICMS
-            aliq_icms_original = campos[4]
-            campos[4] = "0,00"  # ALIQ ICMS
-            #campos[5] = "0,00"  # VL CONTABIL NUNCA ZERAR
-            campos[6] = "0,00"  # VL_ICMS
-            campos[7] = "0,00"  # VL_BC_ICMS_ST
-            campos[8] = "0,00"  # VL_ICMS_ST
-            campos[9] = "0,00"
-            campos[10] = "0,00" # VL_IPI
-            campos[11] = "0,00"
-            print("lista",list(enumerate(campos)))
-
-            #|C190|051|1910|0,00|1034,81|0,00|0,00|0,00|0,00|0,00|0,00||||||||| (exemplo de C190 zerado)
-            #|C190|500|1403|0,00|4719,47|0,00|0,00|0,00|564,27|0,00|0,00|||||||||
-            #print(f"[INFO] C190 zerado com sucesso (ALIQ_ICMS antes: {aliq_icms_original}): {linha.strip()}")
-            linha_zerada = "|".join(campos)
-            print(f"[INFO] C190 zerado com sucesso (ALIQ_ICMS antes: {aliq_icms_original}): {linha_zerada}")
-
-    except IndexError as e:
-        print(f"[ERRO] Linha malformada: {linha.strip()} | Erro: {e}")
-
-    return "|".join(campos) + "|\n"
-
-
-def ler_xml_notas(pasta_xml):
-    """
-    Lê todos os XMLs da pasta e extrai:
-    - chave da nota
-    - número da nota
-    - data de emissão
-    - lista de duplicatas (nDup, dVenc, vDup)
-    """
-    notas = {}
-    print("\n🔎 Lendo XMLs da pasta:", pasta_xml)
-    for arquivo in os.listdir(pasta_xml):
-        if not arquivo.endswith(".xml"):
-            continue
-        caminho = os.path.join(pasta_xml, arquivo)
-        print(f"\n📄 Processando XML: {arquivo}")
-        tree = ET.parse(caminho)
-        root = tree.getroot()
-
-        # Tenta pegar chave da NF-e
-        chave_el = root.find(".//{*}chNFe")
-        if chave_el is not None and chave_el.text:
-            chave = chave_el.text.strip()
-        else:
-            # Se não achou, tenta pegar chave da NF dentro do CT-e
-            chave_el = root.find(".//{*}infNFe/{*}chave")
-            chave = chave_el.text.strip() if chave_el is not None and chave_el.text else None
-
-        print("➡️ Chave:", chave)
-
-        # Agora tenta pegar o número da NF
-        n_nf = None
-        n_nf_el = root.find(".//{*}nNF")
-
-        if n_nf_el is not None and n_nf_el.text:
-            n_nf = n_nf_el.text.strip()
-        else:
-            # Caso seja CT-e (não tem <nNF>)
-            if chave and len(chave) == 44:
-                n_nf = chave[25:34].lstrip("0")
-
-        print("➡️ Número NF:", n_nf)
-
-        # Data de emissão
-        dhEmi = root.find(".//{*}dhEmi")
-        if dhEmi is None:
-            dhEmi = root.find(".//{*}dEmi")
-        if dhEmi is not None:
-            data_emissao = datetime.fromisoformat(dhEmi.text).date()
-            print("➡️ Data emissão (dhEmi/dEmi):", data_emissao)
-        else:
-            print("⚠️ Nenhuma data de emissão encontrada!")
-            data_emissao = None
-
-        # Duplicatas
-        duplicatas = []
-        for dup in root.findall(".//{*}dup"):
-            duplicata = {
-                "nDup": dup.find("{*}nDup").text,
-                "dVenc": dup.find("{*}dVenc").text,
-                "vDup": dup.find("{*}vDup").text
-            }
-            duplicatas.append(duplicata)
-        print("➡️ Duplicatas encontradas:", duplicatas if duplicatas else "Nenhuma")
-
-        notas[chave] = {
-            "numero": n_nf,
-            "emissao": data_emissao,
-            "duplicatas": duplicatas
-        }
-    return notas
-
-import re
-from datetime import datetime, timedelta
-def _num2(valor):
-    """
-    Normaliza número de parcela para 2 dígitos (01..99).
-    Remove não-dígitos, converte para int e volta em 2 dígitos.
-    Se não der pra converter, retorna '01'.
-    """
-    s = re.sub(r"\D", "", str(valor or ""))
-    try:
-        return f"{int(s):02d}"
-    except:
-        return "01"
-
-
-def processar_sped(arquivo_sped, notas_xml, saida_sped):
-    global cfops_lista
-    cfops_lista = list(combo_cfops['values'])
-
-    c100_chave = None
-    cfop_c190 = None
-    """
-    Lê o SPED, insere registros C140/C141, ajusta C990, 9900 e |9999|.
-    """
-    print("\n📑 Lendo SPED:", arquivo_sped)
-    with open(arquivo_sped, "r", encoding="latin1") as f:
-        linhas = f.readlines()
-
-    novas_linhas = []
-    bloco9 = []
-    dentro_bloco9 = False
-    count_c140, count_c141 = 0, 0
-
-    for i, linha in enumerate(linhas):
-        if linha.startswith("|9001|"):
-            dentro_bloco9 = True
-
-        if dentro_bloco9:
-            bloco9.append(linha)
-            continue
-
-        if linha.startswith("|C990|"):
-            continue  # vamos recalcular depois
-
-        campos = linha.strip().split("|")
-        if campos[1] in ("C100", "C190"):
-            linha = limpar_icms_c100_e_c190(linha)
-
-
-        novas_linhas.append(linha)
-        campos = linha.strip().split("|")
-
-        # Encontrando C100
-        if len(campos) > 9 and campos[1] == "C100" and campos[2] == "0":
-            mod = campos[5].strip()
-            chave_atual = campos[9].strip()
-            print(f"\n🔍 Encontrado C100 com chave {chave_atual}, modelo {mod}")
-
-            gerar_duplicata = True
-            cfop_c190 = None
-
-            for j in range(i+1, len(linhas)):
-                campos_next = linhas[j].strip().split("|")
-                if len(campos_next) > 2 and campos_next[1] == "C190":
-                    cfop_c190 = campos_next[3].strip()
-                    if cfop_c190 in cfops_lista:  # usa a lista dinâmica
-                        gerar_duplicata = False
-                    break
-
-
-            # Apenas NFe (55) e NFCe (65) aceitam duplicatas
-            if mod not in ["55", "65", "57"] or not gerar_duplicata:
-                    print(f"⚠️ Modelo {mod} ou CFOP {cfop_c190} não aceita duplicatas. Ignorando C140/C141.")
-                    continue
-
-            if chave_atual not in notas_xml:
-                print(f"⚠️ Chave {chave_atual} não encontrada. XMLs carregados: {list(notas_xml.keys())}")
-                continue
-
-            nota = notas_xml[chave_atual]
-            duplicatas = nota["duplicatas"]
-
-            # Se não houver duplicatas, cria fictícia
-            if not duplicatas:
-                emissao = nota["emissao"]
-                vl_total = campos[12]
-                duplicatas = [{
-                    "nDup": "01",
-                    "dVenc": (emissao + timedelta(days=30)).strftime("%Y-%m-%d"),
-                    "vDup": vl_total
-                }]
-
-            qtd_parc = len(duplicatas)
-            vl_total = sum([float(d["vDup"].replace(",", ".")) for d in duplicatas])
-            vl_total_str = f"{vl_total:.2f}".replace(".", ",")
-
-            # ---------------- C140 ----------------
-            ind_emit = "1"  # emissão própria
-            ind_tit = "00"  # duplicata
-            desc_tit = ""   # só usado se ind_tit=99
-            num_tit  = _num2(duplicatas[0].get("nDup", "1"))
-
-            c140 = f"|C140|{ind_emit}|{ind_tit}|{desc_tit}|{num_tit}|{qtd_parc}|{vl_total_str}|\n"
-            novas_linhas.append(c140)
-            count_c140 += 1
-            print("➕ Adicionado C140:", c140.strip())
-
-            # ---------------- C141 ----------------
-            for dup in duplicatas:
-                dVenc = datetime.fromisoformat(dup["dVenc"]).strftime("%d%m%Y")  # ddmmaaaa
-                valor = float(dup['vDup'].replace(",", "."))
-                valor_sped = f"{valor:.2f}".replace(".", ",")
-                nDup_sped = _num2(dup.get('nDup', '1'))  # garante 2 dígitos SEM 3 dígitos
-                c141 = f"|C141|{nDup_sped}|{dVenc}|{valor_sped}|\n"
-                novas_linhas.append(c141)
-                count_c141 += 1
-                print("➕ Adicionado C141:", c141.strip())
-
-    # ---------------- Recalcular C990 ----------------
-    qtd_lin_c = sum(1 for l in novas_linhas if l.startswith("|C")) + 1
-    c990 = f"|C990|{qtd_lin_c}|\n"
-    print(f"\n♻️ Recalculado C990: {c990.strip()}")
-
-    ult_c_index = max((i for i, l in enumerate(novas_linhas) if l.startswith("|C")), default=-1)
-    if ult_c_index >= 0:
-        novas_linhas_corrigidas = (
-            novas_linhas[:ult_c_index + 1] +
-            [c990] +
-            novas_linhas[ult_c_index + 1:]
-        )
-    else:
-        novas_linhas_corrigidas = [c990] + novas_linhas
-
-    # ---------------- Atualizar bloco 9 ----------------
-    bloco9_atualizado, count_9900, count_lin9 = atualizar_bloco9(bloco9, count_c140, count_c141)
-
-    # Junta tudo: registros normais + bloco 9 atualizado
-    novas_linhas_corrigidas += bloco9_atualizado
-
-    # ---------------- Atualizar |9999| ----------------
-    
-        # Atualizar |9900|9900|<total>
-    for i, linha in enumerate(novas_linhas_corrigidas):
-        if linha.startswith("|9900|9900|"):
-            novas_linhas_corrigidas[i] = f"|9900|9900|{count_9900}|\n"
-            print(f"♻️ Atualizado total de 9900 para {count_9900}")
-            break
-
-    # Atualizar |9990|<linhas do bloco 9>
-    for i, linha in enumerate(novas_linhas_corrigidas):
-        if linha.startswith("|9990|"):
-            novas_linhas_corrigidas[i] = f"|9990|{count_lin9}|\n"
-            print(f"♻️ Atualizado total de linhas do Bloco 9 para {count_lin9}")
-            break
-    
-    # Atualizar |9999| para total de linhas do SPED
-    total_linhas = len(novas_linhas_corrigidas)
-    for i, linha in enumerate(novas_linhas_corrigidas):
-        if linha.startswith("|9999|"):
-            novas_linhas_corrigidas[i] = f"|9999|{total_linhas}|\n"
-            print(f"♻️ Atualizado |9999| para {total_linhas}")
-            break
-
-    # ---------------- Salvar arquivo ----------------
-    with open(saida_sped, "w", encoding="latin1") as f:
-        f.writelines(novas_linhas_corrigidas)
-
-    print("\n✅ SPED corrigido gerado em:", saida_sped)
-
-
-
-def atualizar_bloco9(bloco9, count_c140, count_c141):
-    novas_linhas = []
-    atualizado_c140 = False
-    atualizado_c141 = False
-
-    for linha in bloco9:
-        if linha.startswith("|9900|C140|"):
-            qtd = int(linha.split("|")[3])
-            linha = f"|9900|C140|{qtd + count_c140}|\n"
-            atualizado_c140 = True
-        elif linha.startswith("|9900|C141|"):
-            qtd = int(linha.split("|")[3])
-            linha = f"|9900|C141|{qtd + count_c141}|\n"
-            atualizado_c141 = True
-
-        # Adiciona todas as 9900 exceto |9999|
-        if not linha.startswith("|9999|"):
-            novas_linhas.append(linha)
-
-    # Inserir C140/C141 se não existirem, após C990
-    idx_c990 = next((i for i, l in enumerate(novas_linhas) if l.startswith("|9900|C990|")), None)
-    if idx_c990 is not None:
-        if not atualizado_c140 and count_c140 > 0:
-            novas_linhas.insert(idx_c990 + 1, f"|9900|C140|{count_c140}|\n")
-            idx_c990 += 1
-        if not atualizado_c141 and count_c141 > 0:
-            novas_linhas.insert(idx_c990 + 1, f"|9900|C141|{count_c141}|\n")
-
-    # Adiciona |9999| temporário
-    novas_linhas.append("|9999|0|\n")
+from tkinter import filedialog, messagebox, scrolledtext, ttk
 
-    # Contagem real do Bloco 9
-    count_9900 = sum(1 for l in novas_linhas if l.startswith("|9900|") and not l.startswith("|9999|"))
-    count_lin9 = len(novas_linhas)  # inclui todas as linhas do bloco 9
+from cfops import carregar_cfops, compilar_cfops, regra_cfop_valida, salvar_cfops
+from incremental import processar_sped_incremental
+from progresso import ProcessamentoCancelado
+from relatorio import Relatorio, etapa, perfil
+from sped import chaves_do_sped
+from xml_notas import ler_xml_notas
 
-    return novas_linhas, count_9900, count_lin9
-
-import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext
-import os
 
 def escolher_pasta_xml(entry):
     pasta = filedialog.askdirectory()
@@ -346,6 +21,12 @@ def escolher_pasta_xml(entry):
         entry.delete(0, tk.END)
         entry.insert(0, pasta)
 
+def escolher_zip_xml(entry):
+    arquivo = filedialog.askopenfilename(filetypes=[("XMLs compactados", "*.zip")])
+    if arquivo:
+        entry.delete(0, tk.END)
+        entry.insert(0, arquivo)
+
 def escolher_sped(entry):
     arquivo = filedialog.askopenfilename(filetypes=[("Arquivos SPED", "*.txt")])
     if arquivo:
@@ -354,12 +35,37 @@ def escolher_sped(entry):
 
 # ---------------- FUNÇÃO DE LOG ----------------
 
+# Quantas mensagens entram no painel por ciclo do acompanhar() e quantas
+# linhas o painel guarda no máximo
+LIMITE_LOG_POR_CICLO = 200
+LIMITE_LINHAS_LOG = 5000
+
+
 def log(texto):
+    log_lote([texto])
+
+
+def log_lote(textos):
+    """Insere várias mensagens de uma vez (um único insert no widget)."""
+    if len(textos) > LIMITE_LOG_POR_CICLO:
+        omitidas = len(textos) - LIMITE_LOG_POR_CICLO
+        textos = [f"… {omitidas} mensagens omitidas"] + textos[-LIMITE_LOG_POR_CICLO:]
+
     text_logs.configure(state='normal')
-    text_logs.insert(tk.END, texto + "\n")
+    text_logs.insert(tk.END, "\n".join(textos) + "\n")
+    excesso = int(text_logs.index("end-1c").split(".")[0]) - LIMITE_LINHAS_LOG
+    if excesso > 0:
+        text_logs.delete("1.0", f"{excesso + 1}.0")
     text_logs.see(tk.END)
     text_logs.configure(state='disabled')
 
+
+class _HandlerFila(logging.Handler):
+    """Manda os registros de log do processamento para a fila da interface."""
+
+    def emit(self, record):
+        fila_eventos.put(("log", self.format(record)))
+
 # ---------------- FUNÇÃO EXECUTAR ----------------
 
 def executar():
@@ -386,124 +92,227 @@ def executar():
     text_logs.delete(1.0, tk.END)
     text_logs.configure(state='disabled')
 
-    try:
-        log("🔎 Lendo XMLs da pasta: " + pasta_xml)
-        notas = ler_xml_notas(pasta_xml)  # Mantém sua função existente
-        log(f"📄 {len(notas)} XMLs processados.")
+    barra_progresso["value"] = 0
+    label_progresso.configure(text="")
+    inicio_etapa.clear()
+    cancelar_evento.clear()
+    btn_executar.configure(state="disabled")
+    btn_cancelar.configure(state="normal")
+
+    logging.getLogger().setLevel(logging.DEBUG if log_detalhado.get() else logging.INFO)
+
+    threading.Thread(
+        target=_processar,
+        args=(pasta_xml, arquivo_sped, saida_sped, cfops_avista, gerar_relatorio.get()),
+        daemon=True,
+    ).start()
+    root.after(100, acompanhar)
+
+
+def cancelar():
+    cancelar_evento.set()
+    btn_cancelar.configure(state="disabled")
+    log("⏹ Cancelando...")
 
-        processar_sped(arquivo_sped, notas, saida_sped)  # Mantém sua função existente
-        log(f"✅ SPED corrigido gerado: {saida_sped}")
+# ---------------- PROCESSAMENTO EM SEGUNDO PLANO ----------------
 
-        messagebox.showinfo("Sucesso", f"Novo SPED gerado: {saida_sped}")
+# A thread de processamento nunca mexe nos widgets: ela só põe eventos na
+# fila, que a interface lê em acompanhar() via root.after.
+fila_eventos = queue.Queue()
+cancelar_evento = threading.Event()
+inicio_etapa = {}
+
+
+def _processar(pasta_xml, arquivo_sped, saida_sped, cfops_avista, com_relatorio=False):
+    def progresso(etapa, feitos, total, extra):
+        if cancelar_evento.is_set():
+            raise ProcessamentoCancelado()
+        fila_eventos.put(("progresso", etapa, feitos, total, extra))
+
+    # Com o relatório ligado, grava <saida>.relatorio.json e <saida>.prof
+    relatorio = Relatorio() if com_relatorio else None
+    try:
+        with perfil(saida_sped + ".prof" if com_relatorio else None):
+            with etapa(relatorio, "sped.chaves"):
+                chaves = chaves_do_sped(arquivo_sped)
+            canceladas = set()
+            duplicados = []
+            notas = ler_xml_notas(pasta_xml, processos=None, progresso=progresso, relatorio=relatorio,
+                                  chaves=chaves, canceladas=canceladas, duplicados=duplicados)
+            processar_sped_incremental(arquivo_sped, notas, saida_sped, cfops_avista, progresso=progresso,
+                                       relatorio=relatorio, canceladas=canceladas)
+        if relatorio is not None:
+            relatorio.dados.update({"xml": pasta_xml, "sped": arquivo_sped, "saida": saida_sped,
+                                    "notas": len(notas),
+                                    "duplicados": [{"arquivo": nome, "mantido": mantido, "motivo": motivo}
+                                                   for nome, mantido, motivo in duplicados]})
+            relatorio.salvar(saida_sped + ".relatorio.json")
+        fila_eventos.put(("fim", saida_sped))
+    except ProcessamentoCancelado:
+        fila_eventos.put(("cancelado", None))
     except Exception as e:
-        log(f"❌ Erro: {str(e)}")
-        messagebox.showerror("Erro", str(e))
+        fila_eventos.put(("erro", str(e)))
 
-CFOPS_FILE = "cfops_avista.json"
 
-import os
-import json
-import tkinter as tk
-from tkinter import filedialog, messagebox, scrolledtext, ttk
-from datetime import datetime, timedelta
+def acompanhar():
+    ultimo_progresso = None
+    mensagens = []
+    while True:
+        try:
+            evento = fila_eventos.get_nowait()
+        except queue.Empty:
+            break
 
-# ---------------- FUNÇÕES CFOPS ----------------
+        tipo = evento[0]
+        if tipo == "progresso":
+            # Só o mais recente de cada leva interessa para a barra
+            ultimo_progresso = evento[1:]
+            continue
+        if tipo == "log":
+            mensagens.append(evento[1])
+            continue
+
+        if mensagens:
+            log_lote(mensagens)
+        if ultimo_progresso:
+            mostrar_progresso(*ultimo_progresso)
+        btn_executar.configure(state="normal")
+        btn_cancelar.configure(state="disabled")
+        if tipo == "fim":
+            log(f"✅ SPED corrigido gerado: {evento[1]}")
+            messagebox.showinfo("Sucesso", f"Novo SPED gerado: {evento[1]}")
+        elif tipo == "cancelado":
+            log("⛔ Processamento cancelado.")
+        else:
+            log(f"❌ Erro: {evento[1]}")
+            messagebox.showerror("Erro", evento[1])
+        return
 
-def carregar_cfops():
-    if os.path.exists(CFOPS_FILE):
-        with open(CFOPS_FILE, "r") as f:
-            return json.load(f)
+    if mensagens:
+        log_lote(mensagens)
+    if ultimo_progresso:
+        mostrar_progresso(*ultimo_progresso)
+    root.after(100, acompanhar)
+
+
+def _formatar_tempo(segundos):
+    segundos = int(segundos)
+    return f"{segundos // 60}:{segundos % 60:02d}"
+
+
+def mostrar_progresso(etapa, feitos, total, extra):
+    agora = time.perf_counter()
+    inicio, feitos_inicio = inicio_etapa.setdefault(etapa, (agora, feitos))
+    decorrido = agora - inicio
+    taxa = (feitos - feitos_inicio) / decorrido if decorrido > 0 else 0
+
+    barra_progresso["value"] = 100 * feitos / total if total else 0
+
+    if etapa == "xml":
+        texto = f"XMLs: {feitos}/{total} ({taxa:.0f}/s)"
     else:
-        # CFOPs default
-        return [
-    "5101",  # Venda de produção do estabelecimento
-    "5125",  # Remessa para industrialização
-    "5910",  # Remessa em bonificação, doação ou brinde (intraestadual)
-    "5911",  # Remessa de amostra grátis
-    "5912",  # Remessa de mercadoria para demonstração
-    "5913",  # Retorno de mercadoria recebida para demonstração
-    "5914",  # Remessa para exposição ou feira
-    "5915",  # Remessa para conserto ou reparo
-    "5916",  # Retorno de mercadoria para conserto ou reparo
-    "5917",  # Remessa em consignação mercantil ou industrial
-    "5918",  # Devolução de mercadoria recebida em consignação
-    "5919",  # Devolução simbólica de mercadoria vendida ou usada em processo industrial
-    "5920",  # Remessa de vasilhame ou sacaria
-    "5921",  # Devolução de vasilhame ou sacaria
-    "5922",  # Faturamento de venda para entrega futura
-    "5923",  # Remessa por conta e ordem de terceiros
-    "5924",  # Remessa para industrialização por conta e ordem
-    "5925",  # Retorno de mercadoria recebida para industrialização
-    "6114",  # Remessa em consignação interestadual
-    "6102",  # Bonificação interestadual
-    "6401",  # Bonificação
-    "6910",  # Remessa em bonificação, doação ou brinde (interestadual)
-    "6917"   # Remessa em consignação interestadual
-    ]
-
-def salvar_cfops():
-    with open(CFOPS_FILE, "w") as f:
-        json.dump(cfops_lista, f, indent=4)
+        linhas = extra["linhas"]
+        texto = f"SPED: {linhas} linhas ({linhas / decorrido if decorrido > 0 else 0:.0f}/s)"
+        if "c140" in extra:
+            texto += f" | C140: {extra['c140']} C141: {extra['c141']}"
+
+    if taxa > 0 and total and feitos < total:
+        texto += f" | restam {_formatar_tempo((total - feitos) / taxa)}"
+    label_progresso.configure(text=texto)
+
+# ---------------- FUNÇÕES CFOPS ----------------
 
 def adicionar_cfop():
+    global cfops_avista
     novo = entry_novo_cfop.get().strip()
-    if not novo:
-        messagebox.showwarning("Aviso", "Digite um CFOP válido.")
+    if not regra_cfop_valida(novo):
+        messagebox.showwarning("Aviso", "Digite um CFOP válido (ex.: 5910, 5.9xx ou 5901-5949).")
         return
     if novo in cfops_lista:
         messagebox.showinfo("Info", f"O CFOP {novo} já está na lista.")
         return
     cfops_lista.append(novo)
+    cfops_avista = compilar_cfops(cfops_lista)
     combo_cfops['values'] = cfops_lista
-    salvar_cfops()
+    salvar_cfops(cfops_lista)
     entry_novo_cfop.delete(0, tk.END)
     log(f"✅ CFOP {novo} adicionado à lista.")
 
 # ---------------- INTERFACE GRÁFICA ----------------
 
-root = tk.Tk()
-root.title("Gerar SPED com Duplicatas")
-root.geometry("800x700")
-root.resizable(False, False)
-root.configure(bg="#f0f0f0")
-
-# Frame XML
-frame1 = tk.Frame(root, bg="#f0f0f0")
-frame1.pack(padx=10, pady=5, fill="x")
-tk.Label(frame1, text="Pasta de XML:", bg="#f0f0f0").pack(side=tk.LEFT)
-entry_xml = tk.Entry(frame1, width=60)
-entry_xml.pack(side=tk.LEFT, padx=5)
-tk.Button(frame1, text="Procurar", command=lambda: escolher_pasta_xml(entry_xml), bg="#007ACC", fg="white").pack(side=tk.LEFT)
-
-# Frame SPED
-frame2 = tk.Frame(root, bg="#f0f0f0")
-frame2.pack(padx=10, pady=5, fill="x")
-tk.Label(frame2, text="Arquivo SPED:", bg="#f0f0f0").pack(side=tk.LEFT)
-entry_sped = tk.Entry(frame2, width=60)
-entry_sped.pack(side=tk.LEFT, padx=5)
-tk.Button(frame2, text="Procurar", command=lambda: escolher_sped(entry_sped), bg="#007ACC", fg="white").pack(side=tk.LEFT)
-
-# Frame CFOPS
-frame_cfops = tk.Frame(root, bg="#f0f0f0")
-frame_cfops.pack(padx=10, pady=5, fill="x")
-tk.Label(frame_cfops, text="CFOPS à Vista:", bg="#f0f0f0").pack(side=tk.LEFT)
-cfops_lista = carregar_cfops()
-combo_cfops = ttk.Combobox(frame_cfops, values=cfops_lista, width=15)
-combo_cfops.pack(side=tk.LEFT, padx=5)
-entry_novo_cfop = tk.Entry(frame_cfops, width=10)
-entry_novo_cfop.pack(side=tk.LEFT, padx=5)
-tk.Button(frame_cfops, text="Adicionar", command=adicionar_cfop, bg="#007ACC", fg="white").pack(side=tk.LEFT)
-
-# Botão executar
-frame3 = tk.Frame(root, bg="#f0f0f0")
-frame3.pack(pady=10)
-tk.Button(frame3, text="Gerar SPED Corrigido", command=executar, bg="green", fg="white", font=("Arial", 12, "bold")).pack()
-
-# Logs
-frame_logs = tk.Frame(root)
-frame_logs.pack(padx=10, pady=10, fill="both", expand=True)
-tk.Label(frame_logs, text="Logs de Processamento:").pack(anchor="w")
-text_logs = scrolledtext.ScrolledText(frame_logs, width=95, height=25, state='disabled', bg="#1e1e1e", fg="white", font=("Consolas", 10))
-text_logs.pack(fill="both", expand=True)
-
-root.mainloop()
\ No newline at end of file
+def main():
+    global root, entry_xml, entry_sped, cfops_lista, cfops_avista, combo_cfops, entry_novo_cfop, text_logs
+    global btn_executar, btn_cancelar, barra_progresso, label_progresso, log_detalhado, gerar_relatorio
+
+    handler = _HandlerFila()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.getLogger().addHandler(handler)
+
+    root = tk.Tk()
+    root.title("Gerar SPED com Duplicatas")
+    root.geometry("800x700")
+    root.resizable(False, False)
+    root.configure(bg="#f0f0f0")
+
+    # Frame XML
+    frame1 = tk.Frame(root, bg="#f0f0f0")
+    frame1.pack(padx=10, pady=5, fill="x")
+    tk.Label(frame1, text="Pasta de XML:", bg="#f0f0f0").pack(side=tk.LEFT)
+    entry_xml = tk.Entry(frame1, width=60)
+    entry_xml.pack(side=tk.LEFT, padx=5)
+    tk.Button(frame1, text="Procurar", command=lambda: escolher_pasta_xml(entry_xml), bg="#007ACC", fg="white").pack(side=tk.LEFT)
+    tk.Button(frame1, text="ZIP", command=lambda: escolher_zip_xml(entry_xml), bg="#007ACC", fg="white").pack(side=tk.LEFT, padx=5)
+
+    # Frame SPED
+    frame2 = tk.Frame(root, bg="#f0f0f0")
+    frame2.pack(padx=10, pady=5, fill="x")
+    tk.Label(frame2, text="Arquivo SPED:", bg="#f0f0f0").pack(side=tk.LEFT)
+    entry_sped = tk.Entry(frame2, width=60)
+    entry_sped.pack(side=tk.LEFT, padx=5)
+    tk.Button(frame2, text="Procurar", command=lambda: escolher_sped(entry_sped), bg="#007ACC", fg="white").pack(side=tk.LEFT)
+
+    # Frame CFOPS
+    frame_cfops = tk.Frame(root, bg="#f0f0f0")
+    frame_cfops.pack(padx=10, pady=5, fill="x")
+    tk.Label(frame_cfops, text="CFOPS à Vista:", bg="#f0f0f0").pack(side=tk.LEFT)
+    cfops_lista = carregar_cfops()
+    cfops_avista = compilar_cfops(cfops_lista)
+    combo_cfops = ttk.Combobox(frame_cfops, values=cfops_lista, width=15)
+    combo_cfops.pack(side=tk.LEFT, padx=5)
+    entry_novo_cfop = tk.Entry(frame_cfops, width=10)
+    entry_novo_cfop.pack(side=tk.LEFT, padx=5)
+    tk.Button(frame_cfops, text="Adicionar", command=adicionar_cfop, bg="#007ACC", fg="white").pack(side=tk.LEFT)
+
+    # Botão executar
+    frame3 = tk.Frame(root, bg="#f0f0f0")
+    frame3.pack(pady=10)
+    btn_executar = tk.Button(frame3, text="Gerar SPED Corrigido", command=executar, bg="green", fg="white", font=("Arial", 12, "bold"))
+    btn_executar.pack(side=tk.LEFT, padx=5)
+    btn_cancelar = tk.Button(frame3, text="Cancelar", command=cancelar, bg="#b22222", fg="white", font=("Arial", 12, "bold"), state="disabled")
+    btn_cancelar.pack(side=tk.LEFT, padx=5)
+
+    # Progresso
+    frame_progresso = tk.Frame(root, bg="#f0f0f0")
+    frame_progresso.pack(padx=10, fill="x")
+    barra_progresso = ttk.Progressbar(frame_progresso, maximum=100)
+    barra_progresso.pack(fill="x")
+    label_progresso = tk.Label(frame_progresso, text="", bg="#f0f0f0", anchor="w")
+    label_progresso.pack(fill="x")
+
+    # Logs
+    frame_logs = tk.Frame(root)
+    frame_logs.pack(padx=10, pady=10, fill="both", expand=True)
+    tk.Label(frame_logs, text="Logs de Processamento:").pack(anchor="w")
+    log_detalhado = tk.BooleanVar(value=False)
+    tk.Checkbutton(frame_logs, text="Log detalhado (por registro/XML, mais lento)", variable=log_detalhado).pack(anchor="w")
+    gerar_relatorio = tk.BooleanVar(value=False)
+    tk.Checkbutton(frame_logs, text="Relatório de desempenho (<saída>.relatorio.json e .prof)", variable=gerar_relatorio).pack(anchor="w")
+    text_logs = scrolledtext.ScrolledText(frame_logs, width=95, height=25, state='disabled', bg="#1e1e1e", fg="white", font=("Consolas", 10))
+    text_logs.pack(fill="both", expand=True)
+
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
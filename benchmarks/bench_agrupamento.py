@@ -0,0 +1,48 @@
+"""
+Benchmark do agrupamento C100 -> filhos em processar_sped.
+
+Gera SPEDs sintéticos de tamanhos crescentes (metade dos C100 sem C190, que
+era o pior caso da varredura antiga) e mostra o tempo por linha. Com o
+agrupamento em passada única o tempo por linha deve ficar estável.
+
+Uso: python benchmarks/bench_agrupamento.py [qtd_c100 ...]
+"""
+import contextlib
+import math
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import geradores
+from sped import processar_sped
+
+
+def gerar_sped(caminho, qtd_c100):
+    """SPED só com o bloco C: cada C100 com um C170, metade sem C190."""
+    geradores.gerar_sped(caminho, math.ceil(qtd_c100 * 2.5), c170_por_c100=1, c190_por_c100=0.5,
+                         fracao_outros=0)
+
+
+def medir(qtd_c100, pasta):
+    entrada = os.path.join(pasta, f"sped_{qtd_c100}.txt")
+    saida = os.path.join(pasta, f"saida_{qtd_c100}.txt")
+    gerar_sped(entrada, qtd_c100)
+    with open(entrada, "rb") as f:
+        qtd_linhas = sum(1 for _ in f)
+
+    inicio = time.perf_counter()
+    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+        processar_sped(entrada, {}, saida)
+    return qtd_linhas, time.perf_counter() - inicio
+
+
+if __name__ == "__main__":
+    tamanhos = [int(a) for a in sys.argv[1:]] or [5_000, 10_000, 20_000, 40_000]
+    with tempfile.TemporaryDirectory() as pasta:
+        print(f"{'C100':>10} {'linhas':>10} {'tempo (s)':>10} {'us/linha':>10}")
+        for qtd in tamanhos:
+            linhas, tempo = medir(qtd, pasta)
+            print(f"{qtd:>10} {linhas:>10} {tempo:>10.3f} {tempo / linhas * 1e6:>10.2f}")
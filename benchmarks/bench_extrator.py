@@ -0,0 +1,61 @@
+"""
+Tempo e pico de memória por arquivo de extrair_nota numa NF-e grande
+(milhares de <det>), comparado com o parse da árvore inteira + find(".//").
+
+Uso: python benchmarks/bench_extrator.py [qtd_itens ...]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geradores import chave_nfe, xml_nfe
+from xml_notas import extrair_nota
+
+CHAVE = chave_nfe(1)
+
+
+def gerar_nfe(caminho, itens):
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write(xml_nfe(CHAVE, 1, 3, itens))
+
+
+def arvore_completa(caminho):
+    """Referência: árvore inteira em memória e buscas .// como antes."""
+    root = ET.parse(caminho).getroot()
+    root.find(".//{*}chNFe")
+    root.find(".//{*}nNF")
+    root.find(".//{*}dhEmi")
+    return [
+        (d.find("{*}nDup").text, d.find("{*}dVenc").text, d.find("{*}vDup").text)
+        for d in root.findall(".//{*}dup")
+    ]
+
+
+def medir(funcao, caminho, repeticoes=5):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao(caminho)
+    tempo = (time.perf_counter() - inicio) / repeticoes
+
+    tracemalloc.start()
+    funcao(caminho)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tempo, pico
+
+
+if __name__ == "__main__":
+    tamanhos = [int(a) for a in sys.argv[1:]] or [100, 1_000, 5_000]
+    with tempfile.TemporaryDirectory() as pasta:
+        print(f"{'itens':>8} {'método':>16} {'ms/arquivo':>11} {'pico (KB)':>10}")
+        for itens in tamanhos:
+            caminho = os.path.join(pasta, f"nfe_{itens}.xml")
+            gerar_nfe(caminho, itens)
+            for nome, funcao in (("árvore completa", arvore_completa), ("extrair_nota", extrair_nota)):
+                tempo, pico = medir(funcao, caminho)
+                print(f"{itens:>8} {nome:>16} {tempo * 1000:>11.2f} {pico / 1024:>10.0f}")
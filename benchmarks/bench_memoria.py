@@ -0,0 +1,55 @@
+"""
+Pico de memória de processar_sped conforme o SPED cresce.
+
+Com o processamento em fluxo o pico deve ficar praticamente constante:
+tanto o do Python (tracemalloc) quanto o do processo (RSS), já que o SPED
+é lido uma janela por vez e só o Bloco 9 fica guardado até o fim. O RSS
+é medido num processo novo para cada tamanho, pois o pico do processo só
+cresce.
+
+Uso: python benchmarks/bench_memoria.py [qtd_c100 ...]
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_agrupamento import gerar_sped
+from relatorio import pico_rss
+from sped import processar_sped
+
+
+def _rss(entrada, saida):
+    """Pico de RSS antes e depois de processar_sped (roda num processo novo)."""
+    antes = pico_rss()
+    processar_sped(entrada, {}, saida)
+    return antes, pico_rss()
+
+
+def medir(qtd_c100, pasta):
+    entrada = os.path.join(pasta, f"sped_{qtd_c100}.txt")
+    saida = os.path.join(pasta, f"saida_{qtd_c100}.txt")
+    gerar_sped(entrada, qtd_c100)
+
+    tracemalloc.start()
+    processar_sped(entrada, {}, saida)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        rss_antes, rss = pool.submit(_rss, entrada, saida).result()
+    return os.path.getsize(entrada), pico, rss, rss - rss_antes
+
+
+if __name__ == "__main__":
+    tamanhos = [int(a) for a in sys.argv[1:]] or [10_000, 40_000, 160_000]
+    with tempfile.TemporaryDirectory() as pasta:
+        print(f"{'C100':>10} {'arquivo (MB)':>13} {'pico (MB)':>10} {'RSS (MB)':>9} {'+RSS (MB)':>10}")
+        for qtd in tamanhos:
+            tamanho, pico, rss, acrescimo = medir(qtd, pasta)
+            print(f"{qtd:>10} {tamanho / 2**20:>13.1f} {pico / 2**20:>10.2f} "
+                  f"{rss / 2**20:>9.1f} {acrescimo / 2**20:>10.1f}")
@@ -0,0 +1,39 @@
+"""
+Vazão de ler_xml_notas (arquivos/segundo), serial x pool de processos.
+
+Gera um lote de NF-e sintéticas (com cobr/dup) e lê a mesma pasta com
+diferentes quantidades de processos, sem o cache de XMLs (senão só a
+primeira medida parsearia).
+
+Uso: python benchmarks/bench_xml.py [qtd_xmls] [processos ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geradores import gerar_xmls
+from xml_notas import ler_xml_notas
+
+
+def medir(pasta, processos):
+    inicio = time.perf_counter()
+    notas = ler_xml_notas(pasta, processos=processos, usar_cache=False)
+    return notas, time.perf_counter() - inicio
+
+
+if __name__ == "__main__":
+    qtd = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+    lista_processos = [int(a) for a in sys.argv[2:]] or [1, 2, os.cpu_count() or 1]
+    with tempfile.TemporaryDirectory() as pasta:
+        gerar_xmls(pasta, qtd, fracao_sem_dup=0, itens=20)
+        referencia = None
+        print(f"{'processos':>10} {'tempo (s)':>10} {'arquivos/s':>12}")
+        for processos in lista_processos:
+            notas, tempo = medir(pasta, processos)
+            if referencia is None:
+                referencia = notas
+            assert notas == referencia, "resultado diferente do modo serial"
+            print(f"{processos:>10} {tempo:>10.3f} {qtd / tempo:>12.0f}")
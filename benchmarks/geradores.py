@@ -0,0 +1,145 @@
+"""
+Geradores de dados sintéticos para os benchmarks: SPED EFD ICMS/IPI e
+lotes de XMLs (NF-e com e sem cobr/dup, CT-e).
+
+As chaves das notas seguem chave_nfe(i), então um SPED e um lote gerados
+com a mesma quantidade de documentos se encontram pelo C100.
+Tudo é determinístico (random.Random(semente)).
+"""
+import os
+import random
+
+CFOPS_PRAZO = ("5102", "5405", "6102", "5101")
+CFOPS_AVISTA = ("5910", "6910", "5911")
+
+
+def chave_nfe(i, modelo="55"):
+    """
+    Chave de 44 dígitos do i-ésimo documento sintético, no leiaute da
+    NF-e: cUF(2) AAMM(4) CNPJ(14) mod(2) série(3) nNF(9) tpEmis(1) cNF(8)
+    cDV(1). O dígito verificador não é calculado.
+    """
+    return f"352501{0:014d}{modelo}001{i:09d}1{i % 100000000:08d}{i % 10}"
+
+
+def gerar_sped(caminho, linhas, c170_por_c100=3, c190_por_c100=1.0, fracao_outros=0.3,
+               fracao_avista=0.1, fracao_entrada=0.2, semente=1):
+    """
+    Grava um SPED com aproximadamente `linhas` linhas e devolve
+    (linhas gravadas, quantidade de C100).
+
+    - c170_por_c100: itens por documento
+    - c190_por_c100: média de C190 por documento (1.5 = metade tem dois);
+      0 gera documentos sem C190
+    - fracao_outros: parte das linhas fora do bloco C (0200 e H010), que
+      passam sem alteração
+    - fracao_avista: parte dos C190 com CFOP "à vista" (CFOPS_AVISTA)
+    - fracao_entrada: parte dos C100 de entrada (IND_OPER=1)
+    """
+    rnd = random.Random(semente)
+    por_documento = 1 + c170_por_c100 + c190_por_c100
+    qtd_c100 = max(1, int(linhas * (1 - fracao_outros) / por_documento))
+    qtd_0200 = int(linhas * fracao_outros / 2)
+    qtd_h010 = int(linhas * fracao_outros) - qtd_0200
+    inteiro_c190, resto_c190 = divmod(c190_por_c100, 1)
+
+    gravadas = 0
+    with open(caminho, "w", encoding="latin1", newline="\r\n") as f:
+        escrever = f.write
+        escrever("|0000|017|0|01012025|31012025|EMPRESA SINTETICA LTDA|00000000000100||SP|0||||A|1|\n")
+        escrever("|0001|0|\n")
+        for i in range(qtd_0200):
+            escrever(f"|0200|P{i}|PRODUTO SINTÉTICO {i}|||UN|00|{i % 99999999:08d}||||18,00||\n")
+        escrever(f"|0990|{qtd_0200 + 3}|\n")
+        escrever("|C001|0|\n")
+        gravadas += qtd_0200 + 4
+
+        for i in range(qtd_c100):
+            entrada = rnd.random() < fracao_entrada
+            chave = chave_nfe(i)
+            escrever(
+                f"|C100|{1 if entrada else 0}|{0 if entrada else 1}|P{i}|55|00|1|{i}|{chave}|01012025|01012025|"
+                "1000,00|1|0,00|0,00|1000,00|9|0,00|0,00|0,00|1000,00|180,00|0,00|0,00|0,00|0,00|0,00|0,00|0,00|\n"
+            )
+            for n in range(1, c170_por_c100 + 1):
+                escrever(f"|C170|{n}|P{n}||1|UN|100,00|0,00|0|000|5102|1|100,00|18,00|18,00|0,00|0,00|0,00|0|||\n")
+            qtd_c190 = int(inteiro_c190) + (rnd.random() < resto_c190)
+            for _ in range(qtd_c190):
+                cfop = rnd.choice(CFOPS_AVISTA if rnd.random() < fracao_avista else CFOPS_PRAZO)
+                escrever(f"|C190|000|{cfop}|18,00|1000,00|1000,00|180,00|0,00|0,00|0,00|0,00||\n")
+            gravadas += 1 + c170_por_c100 + qtd_c190
+        escrever("|C990|0|\n")
+
+        escrever("|H001|0|\n|H005|31122024|1000,00|01|\n")
+        for i in range(qtd_h010):
+            escrever(f"|H010|P{i}|UN|10,000|5,00|50,00|0||||50,00|\n")
+        escrever(f"|H990|{qtd_h010 + 3}|\n")
+        # Bloco 9 desatualizado de propósito: o processamento regenera tudo
+        escrever("|9001|0|\n|9900|9900|1|\n|9990|3|\n|9999|0|\n")
+        gravadas += qtd_h010 + 9
+    return gravadas, qtd_c100
+
+
+def xml_nfe(chave, numero, dups, itens):
+    """NF-e autorizada (nfeProc) com `itens` <det> e `dups` duplicatas."""
+    det = "".join(
+        f'<det nItem="{n}"><prod><cProd>{n}</cProd><xProd>ITEM {n}</xProd><CFOP>5102</CFOP>'
+        f"<vProd>10.00</vProd></prod><imposto><ICMS><ICMS00><CST>00</CST><vICMS>1.80</vICMS>"
+        f"</ICMS00></ICMS></imposto></det>"
+        for n in range(1, itens + 1)
+    )
+    cobr = ""
+    if dups:
+        cobr = "<cobr><fat><nFat>1</nFat></fat>" + "".join(
+            f"<dup><nDup>{k:03d}</nDup><dVenc>2025-{k + 1:02d}-10</dVenc><vDup>{1000 / dups:.2f}</vDup></dup>"
+            for k in range(1, dups + 1)
+        ) + "</cobr>"
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00"><NFe>'
+        f'<infNFe Id="NFe{chave}" versao="4.00"><ide><nNF>{numero}</nNF>'
+        f"<dhEmi>2025-01-01T10:00:00-03:00</dhEmi></ide>{det}<total/><transp/>{cobr}</infNFe>"
+        '<Signature xmlns="http://www.w3.org/2000/09/xmldsig#"><SignatureValue>AAAA</SignatureValue></Signature>'
+        f"</NFe><protNFe><infProt><chNFe>{chave}</chNFe><cStat>100</cStat></infProt></protNFe></nfeProc>"
+    )
+
+
+def _cte(chave_cte, chave_nfe_ref):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<cteProc xmlns="http://www.portalfiscal.inf.br/cte" versao="4.00"><CTe>'
+        f'<infCte Id="CTe{chave_cte}"><ide><dhEmi>2025-01-01T10:00:00-03:00</dhEmi></ide>'
+        f"<infCTeNorm><infDoc><infNFe><chave>{chave_nfe_ref}</chave></infNFe></infDoc></infCTeNorm>"
+        "</infCte></CTe></cteProc>"
+    )
+
+
+def gerar_xmls(pasta, qtd, fracao_sem_dup=0.2, fracao_cte=0.0, itens=10, parcelas=3, semente=1,
+               fracao_copias=0.0):
+    """
+    Grava `qtd` XMLs em `pasta`: NF-e das chaves chave_nfe(0..), parte sem
+    cobr/dup (fracao_sem_dup), e uma parte (fracao_cte) de CT-e que
+    referenciam essas NF-e. Uma parte (fracao_copias) ganha também uma
+    cópia baixada de novo ("... (1).xml"). Devolve a quantidade de bytes
+    gravados.
+    """
+    rnd = random.Random(semente)
+    os.makedirs(pasta, exist_ok=True)
+    total = 0
+    for i in range(qtd):
+        chave = chave_nfe(i)
+        if rnd.random() < fracao_cte:
+            nome = f"{chave_nfe(i, '57')}-procCTe.xml"
+            conteudo = _cte(chave_nfe(i, "57"), chave)
+        else:
+            nome = f"{chave}-procNFe.xml"
+            conteudo = xml_nfe(chave, i, 0 if rnd.random() < fracao_sem_dup else parcelas, itens)
+        dados = conteudo.encode("utf-8")
+        nomes = [nome]
+        if fracao_copias and rnd.random() < fracao_copias:
+            nomes.append(nome[:-4] + " (1).xml")
+        for nome in nomes:
+            with open(os.path.join(pasta, nome), "wb") as f:
+                f.write(dados)
+            total += len(dados)
+    return total
@@ -0,0 +1,168 @@
+"""
+Suíte de benchmarks com dados sintéticos (geradores.py).
+
+Para cada tamanho de SPED pedido, gera o SPED e um lote de XMLs com as
+mesmas chaves e mede, separadamente:
+- ler_xml_notas (sem cache, serial, só as chaves dos C100 do SPED, como
+  na linha de comando): arquivos/s e MB/s
+- processar_sped: linhas/s e MB/s
+- gerar_bloco9 sobre a contagem dos registros do arquivo
+
+Cada etapa roda uma vez cronometrada e outra sob tracemalloc para o pico
+de memória (--sem-memoria pula esta). Os resultados são comparados com
+baseline.json (mesma pasta); --gravar-baseline grava os atuais.
+Uma etapa mais lenta que a baseline além da --tolerancia é apontada como
+regressão e o código de saída é 1.
+
+Uso:
+    python benchmarks/suite.py                      # 10k, 100k e 1M linhas
+    python benchmarks/suite.py --linhas 5000000 --xmls 20000
+    python benchmarks/suite.py --c190-por-c100 2 --gravar-baseline
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from geradores import CFOPS_AVISTA, gerar_sped, gerar_xmls
+from sped import chaves_do_sped, gerar_bloco9, processar_sped
+from varredura import contar_registros
+from xml_notas import ler_xml_notas
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def _medir(funcao, com_memoria):
+    inicio = time.perf_counter()
+    resultado = funcao()
+    tempo = time.perf_counter() - inicio
+
+    pico = None
+    if com_memoria:
+        tracemalloc.start()
+        funcao()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return resultado, tempo, pico
+
+
+def executar_cenario(pasta, linhas, qtd_xmls, args):
+    entrada = os.path.join(pasta, f"sped_{linhas}.txt")
+    saida = os.path.join(pasta, f"saida_{linhas}.txt")
+    pasta_xml = os.path.join(pasta, f"xml_{linhas}")
+
+    gravadas, qtd_c100 = gerar_sped(
+        entrada, linhas, c170_por_c100=args.c170_por_c100, c190_por_c100=args.c190_por_c100,
+    )
+    bytes_xml = gerar_xmls(pasta_xml, qtd_xmls, fracao_sem_dup=args.sem_dup, fracao_cte=args.cte,
+                           fracao_copias=args.copias)
+    bytes_sped = os.path.getsize(entrada)
+    chaves = chaves_do_sped(entrada)
+    medidas = {}
+
+    notas, tempo, pico = _medir(lambda: ler_xml_notas(pasta_xml, usar_cache=False, chaves=chaves), args.memoria)
+    medidas["ler_xml_notas"] = {
+        "tempo": tempo, "pico": pico, "itens": qtd_xmls,
+        "itens/s": qtd_xmls / tempo, "MB/s": bytes_xml / 2**20 / tempo,
+    }
+
+    _, tempo, pico = _medir(lambda: processar_sped(entrada, notas, saida, CFOPS_AVISTA), args.memoria)
+    medidas["processar_sped"] = {
+        "tempo": tempo, "pico": pico, "itens": gravadas,
+        "itens/s": gravadas / tempo, "MB/s": bytes_sped / 2**20 / tempo,
+    }
+
+    contagem = Counter()
+    with open(entrada, "rb") as f:
+        contar_registros(f.read(), contagem)
+    repeticoes = 1000
+    _, tempo, _ = _medir(lambda: [gerar_bloco9(contagem) for _ in range(repeticoes)], False)
+    _, _, pico = _medir(lambda: gerar_bloco9(contagem), args.memoria)
+    medidas["gerar_bloco9"] = {
+        "tempo": tempo / repeticoes, "pico": pico, "itens": len(contagem),
+        "itens/s": len(contagem) * repeticoes / tempo, "MB/s": None,
+    }
+    return {"linhas": gravadas, "c100": qtd_c100, "xmls": qtd_xmls, "etapas": medidas}
+
+
+def _chave(args, linhas):
+    return f"linhas={linhas} c170={args.c170_por_c100} c190={args.c190_por_c100} sem_dup={args.sem_dup} cte={args.cte}"
+
+
+def _imprimir(chave, cenario, baseline, tolerancia):
+    regressoes = []
+    print(f"\n📊 {chave} ({cenario['c100']} C100, {cenario['xmls']} XMLs)")
+    print(f"{'etapa':<16} {'tempo (s)':>10} {'itens/s':>12} {'MB/s':>8} {'pico (MB)':>10} {'baseline':>10}")
+    for etapa, m in cenario["etapas"].items():
+        anterior = baseline.get(chave, {}).get("etapas", {}).get(etapa)
+        comparacao = ""
+        if anterior:
+            razao = m["tempo"] / anterior["tempo"]
+            comparacao = f"{razao:>9.2f}x"
+            if razao > 1 + tolerancia:
+                comparacao += " ⚠️"
+                regressoes.append((etapa, razao))
+        mb_s = f"{m['MB/s']:.1f}" if m["MB/s"] is not None else "-"
+        pico = f"{m['pico'] / 2**20:.2f}" if m["pico"] is not None else "-"
+        print(f"{etapa:<16} {m['tempo']:>10.6f} {m['itens/s']:>12.0f} {mb_s:>8} {pico:>10} {comparacao:>10}")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks com SPED e XMLs sintéticos.")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="tamanhos de SPED (linhas) a medir")
+    parser.add_argument("--xmls", type=int, default=None,
+                        help="XMLs por cenário (padrão: 1 para cada 50 linhas, entre 200 e 20000)")
+    parser.add_argument("--c170-por-c100", type=int, default=3)
+    parser.add_argument("--c190-por-c100", type=float, default=1.0)
+    parser.add_argument("--sem-dup", type=float, default=0.2, help="fração de NF-e sem cobr/dup")
+    parser.add_argument("--cte", type=float, default=0.1, help="fração de CT-e no lote de XMLs")
+    parser.add_argument("--copias", type=float, default=0.05,
+                        help="fração de XMLs com uma cópia baixada de novo (\" (1).xml\")")
+    parser.add_argument("--sem-memoria", dest="memoria", action="store_false",
+                        help="não mede o pico de memória (roda cada etapa uma vez só)")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="quanto uma etapa pode ficar mais lenta que a baseline (padrão: 0.25 = 25%%)")
+    parser.add_argument("--gravar-baseline", action="store_true", help="grava os resultados em baseline.json")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    try:
+        with open(BASELINE, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {}
+
+    resultados, regressoes = {}, []
+    with tempfile.TemporaryDirectory() as pasta:
+        for linhas in args.linhas:
+            qtd_xmls = args.xmls or min(20_000, max(200, linhas // 50))
+            chave = _chave(args, linhas)
+            resultados[chave] = executar_cenario(pasta, linhas, qtd_xmls, args)
+            regressoes += _imprimir(chave, resultados[chave], baseline, args.tolerancia)
+
+    if args.gravar_baseline:
+        for cenario in resultados.values():
+            cenario["maquina"] = f"{platform.system()} {platform.machine()} Python {platform.python_version()}"
+        baseline.update(resultados)
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\n💾 Baseline gravada em {BASELINE}")
+
+    if regressoes:
+        print(f"\n⚠️ {len(regressoes)} etapa(s) mais lenta(s) que a baseline além de {args.tolerancia:.0%}.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,67 @@
+import os
+import sqlite3
+
+from notas import nota_de_json, nota_para_json
+
+# ---------------- CACHE DE XMLs ----------------
+
+CACHE_ARQUIVO = ".nfe_duplicatas_cache.sqlite"
+
+# Sobe quando o formato da nota gravada muda; um cache de outra versão é
+# descartado inteiro (PRAGMA user_version)
+VERSAO_CACHE = 4
+
+
+def abrir_cache(pasta_xml):
+    """
+    Abre (ou cria) o cache SQLite guardado dentro da pasta de XMLs (ou, se
+    `pasta_xml` for um .zip, ao lado dele: <zip>.nfe_duplicatas_cache.sqlite).
+    Cada linha corresponde a um XML, identificado pelo nome e validado por
+    mtime (CRC num .zip) e tamanho.
+    """
+    if os.path.isdir(pasta_xml):
+        caminho = os.path.join(pasta_xml, CACHE_ARQUIVO)
+    else:
+        caminho = pasta_xml + CACHE_ARQUIVO
+    con = sqlite3.connect(caminho)
+    if con.execute("PRAGMA user_version").fetchone()[0] != VERSAO_CACHE:
+        con.execute("DROP TABLE IF EXISTS notas")
+        con.execute(f"PRAGMA user_version = {VERSAO_CACHE}")
+    con.execute(
+        """CREATE TABLE IF NOT EXISTS notas (
+            arquivo  TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            tamanho  INTEGER NOT NULL,
+            chave    TEXT,
+            nota     TEXT NOT NULL,
+            raiz     TEXT
+        )"""
+    )
+    con.execute("CREATE INDEX IF NOT EXISTS idx_notas_chave ON notas (chave)")
+    return con
+
+
+def carregar_cache(con):
+    """arquivo -> (mtime_ns, tamanho, chave, nota, raiz) de tudo que está no cache."""
+    return {
+        arquivo: (mtime_ns, tamanho, chave, nota_de_json(nota), raiz)
+        for arquivo, mtime_ns, tamanho, chave, nota, raiz in con.execute(
+            "SELECT arquivo, mtime_ns, tamanho, chave, nota, raiz FROM notas"
+        )
+    }
+
+
+def gravar_cache(con, registros, removidos=()):
+    """
+    Grava registros (arquivo, mtime_ns, tamanho, chave, nota, raiz) e apaga
+    do cache os arquivos que não existem mais na pasta. nota None marca um
+    evento de cancelamento da chave (ou, sem chave, um XML que não é nota);
+    raiz é a do XML (xml_notas.raiz_do_xml), que decide entre duplicados.
+    """
+    with con:
+        con.executemany(
+            "INSERT OR REPLACE INTO notas VALUES (?, ?, ?, ?, ?, ?)",
+            [(a, m, t, c, nota_para_json(n), r) for a, m, t, c, n, r in registros],
+        )
+        con.executemany("DELETE FROM notas WHERE arquivo = ?", [(a,) for a in removidos])
+
@@ -0,0 +1,107 @@
+import json
+import logging
+import os
+import re
+
+CFOPS_FILE = "cfops_avista.json"
+
+logger = logging.getLogger(__name__)
+
+# ---------------- FUNÇÕES CFOPS ----------------
+
+# CFOPs à vista quando não há cfops_avista.json
+CFOPS_PADRAO = (
+    "5101",  # Venda de produção do estabelecimento
+    "5125",  # Remessa para industrialização
+    "5910",  # Remessa em bonificação, doação ou brinde (intraestadual)
+    "5911",  # Remessa de amostra grátis
+    "5912",  # Remessa de mercadoria para demonstração
+    "5913",  # Retorno de mercadoria recebida para demonstração
+    "5914",  # Remessa para exposição ou feira
+    "5915",  # Remessa para conserto ou reparo
+    "5916",  # Retorno de mercadoria para conserto ou reparo
+    "5917",  # Remessa em consignação mercantil ou industrial
+    "5918",  # Devolução de mercadoria recebida em consignação
+    "5919",  # Devolução simbólica de mercadoria vendida ou usada em processo industrial
+    "5920",  # Remessa de vasilhame ou sacaria
+    "5921",  # Devolução de vasilhame ou sacaria
+    "5922",  # Faturamento de venda para entrega futura
+    "5923",  # Remessa por conta e ordem de terceiros
+    "5924",  # Remessa para industrialização por conta e ordem
+    "5925",  # Retorno de mercadoria recebida para industrialização
+    "6114",  # Remessa em consignação interestadual
+    "6102",  # Bonificação interestadual
+    "6401",  # Bonificação
+    "6910",  # Remessa em bonificação, doação ou brinde (interestadual)
+    "6917",  # Remessa em consignação interestadual
+)
+
+
+def carregar_cfops(caminho=None):
+    """
+    CFOPs à vista do JSON `caminho`. Sem caminho vale CFOPS_FILE (da pasta
+    atual) ou, se ele não existir, CFOPS_PADRAO; um caminho informado que
+    não existe levanta FileNotFoundError.
+    """
+    if caminho is None:
+        if not os.path.exists(CFOPS_FILE):
+            return list(CFOPS_PADRAO)
+        caminho = CFOPS_FILE
+    with open(caminho, "r") as f:
+        # Sem repetidos, mantendo a ordem do arquivo
+        return list(dict.fromkeys(json.load(f)))
+
+def salvar_cfops(cfops_lista, caminho=CFOPS_FILE):
+    with open(caminho, "w") as f:
+        json.dump(list(dict.fromkeys(cfops_lista)), f, indent=4)
+
+# ---------------- CLASSIFICAÇÃO DE CFOPS ----------------
+
+_CFOP = re.compile(r"(\d{1,4})([xX]*)")
+
+
+def _expandir(regra):
+    """
+    CFOPs (4 dígitos) cobertos por uma regra:
+    - "5910" ou "5.910": o próprio CFOP
+    - "59xx" ou "5.9xx": todos com o prefixo (x = qualquer dígito)
+    - "5901-5949": faixa, incluindo as pontas
+    """
+    regra = str(regra).replace(".", "").replace(" ", "")
+    if "-" in regra:
+        inicio, _, fim = regra.partition("-")
+        if len(inicio) == len(fim) == 4 and inicio.isdigit() and fim.isdigit() and inicio <= fim:
+            return [f"{n:04d}" for n in range(int(inicio), int(fim) + 1)]
+        return None
+
+    m = _CFOP.fullmatch(regra)
+    if m is None or len(regra) != 4:
+        return None
+    prefixo, curingas = m.groups()
+    if not curingas:
+        return [prefixo]
+    return [prefixo + f"{n:0{len(curingas)}d}" for n in range(10 ** len(curingas))]
+
+
+def regra_cfop_valida(regra):
+    return _expandir(regra) is not None
+
+
+def compilar_cfops(regras):
+    """
+    Transforma a lista de CFOPs "à vista" (com prefixos e faixas, ver
+    _expandir) num frozenset com todos os CFOPs cobertos. Como um CFOP tem
+    só 4 dígitos, o conjunto é pequeno e cada C190 é classificado com um
+    simples `cfop in conjunto`. Um frozenset recebido é devolvido como
+    está (já compilado); regras inválidas são ignoradas com aviso.
+    """
+    if isinstance(regras, frozenset):
+        return regras
+    cfops = set()
+    for regra in regras:
+        expandidos = _expandir(regra)
+        if expandidos is None:
+            logger.warning("⚠️ Regra de CFOP inválida ignorada: %s", regra)
+            continue
+        cfops.update(expandidos)
+    return frozenset(cfops)
@@ -0,0 +1,134 @@
+"""
+Linha de comando (sem interface gráfica) para gerar o SPED com duplicatas.
+
+    python cli.py gerar --xml PASTA --sped ENTRADA.txt --saida SAIDA.txt
+    python cli.py lote manifesto.json
+    python cli.py reparar PASTA
+
+Os módulos de processamento (XML, cache, pool de processos) só são
+importados depois de lidos os argumentos, para a partida ficar rápida
+(ex.: --help); de sped vêm só as opções válidas.
+"""
+import argparse
+import logging
+import sys
+
+
+def _gerar(args):
+    from cfops import carregar_cfops
+    from incremental import processar_sped_incremental
+    from relatorio import Relatorio, etapa, perfil
+    from sped import chaves_do_sped, processar_sped
+    from xml_notas import ler_xml_notas
+
+    cfops_avista = args.cfop if args.cfop else carregar_cfops(args.cfops)
+    canceladas = set()
+    duplicados = []
+    relatorio = Relatorio(memoria=args.memoria) if args.relatorio else None
+
+    with perfil(args.perfil):
+        chaves = None
+        if not args.todos_xmls:
+            with etapa(relatorio, "sped.chaves") as medida:
+                chaves = chaves_do_sped(args.sped)
+                medida["itens"] += len(chaves)
+        notas = ler_xml_notas(args.xml, processos=args.processos, usar_cache=not args.sem_cache,
+                              relatorio=relatorio, reparar=not args.sem_reparo, chaves=chaves,
+                              canceladas=canceladas, duplicados=duplicados)
+
+        if args.completo:
+            processar_sped(args.sped, notas, args.saida, cfops_avista, politica=args.parcial,
+                           existentes=args.existentes, relatorio=relatorio, canceladas=canceladas)
+        else:
+            processar_sped_incremental(args.sped, notas, args.saida, cfops_avista, politica=args.parcial,
+                                       existentes=args.existentes, relatorio=relatorio, canceladas=canceladas)
+
+    if relatorio is not None:
+        relatorio.dados.update({
+            "xml": args.xml, "sped": args.sped, "saida": args.saida, "notas": len(notas),
+            "modo": "completo" if args.completo else "incremental", "processos": args.processos,
+            "duplicados": [{"arquivo": nome, "mantido": mantido, "motivo": motivo}
+                           for nome, mantido, motivo in duplicados],
+        })
+        relatorio.salvar(args.relatorio)
+    return 0
+
+
+def _lote(args):
+    from lote import carregar_manifesto, executar_lote, imprimir_relatorio
+
+    nivel = logging.DEBUG if args.detalhado else logging.INFO
+    resultados = executar_lote(carregar_manifesto(args.manifesto), args.processos, nivel)
+    imprimir_relatorio(resultados)
+    return 1 if any(r["status"] != "ok" for r in resultados) else 0
+
+
+def _reparar(args):
+    from formatacao import reparar_pasta
+
+    return 1 if reparar_pasta(args.pasta, args.processos)["erro"] else 0
+
+
+def main(argv=None):
+    from sped import MODO_EXISTENTES, MODOS_EXISTENTES, POLITICA_PARCIAL, POLITICAS_PARCIAL
+
+    parser = argparse.ArgumentParser(description="Gera SPED com duplicatas (C140/C141) a partir dos XMLs.")
+    parser.add_argument("-v", "--detalhado", action="store_true",
+                        help="log detalhado por registro/XML (nível DEBUG); o padrão é só o resumo")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    gerar = sub.add_parser("gerar", help="processa uma pasta de XMLs e um SPED")
+    gerar.add_argument("--xml", required=True,
+                       help="pasta com os XMLs das notas (pode ter .zip) ou um arquivo .zip")
+    gerar.add_argument("--sped", required=True, help="SPED de entrada (.txt)")
+    gerar.add_argument("--saida", required=True, help="SPED corrigido a gerar")
+    gerar.add_argument("--cfops",
+                       help="JSON com os CFOPs à vista (padrão: cfops_avista.json ou, sem ele, a "
+                            "lista embutida)")
+    gerar.add_argument("--cfop", action="append",
+                       help="CFOP à vista, prefixo (5.9xx) ou faixa (5901-5949); pode repetir "
+                            "e substitui o arquivo --cfops")
+    gerar.add_argument("--parcial", choices=POLITICAS_PARCIAL, default=POLITICA_PARCIAL,
+                       help="documento com CFOPs à vista e a prazo: parcelas inteiras (padrão), "
+                            "proporcionais ao VL_OPR a prazo, ou nenhuma")
+    gerar.add_argument("--existentes", choices=MODOS_EXISTENTES, default=MODO_EXISTENTES,
+                       help="C140/C141 que já existem no SPED de entrada: manter (padrão) ou "
+                            "substituir pelos gerados")
+    gerar.add_argument("-p", "--processos", type=int, default=None,
+                       help="processos para ler os XMLs (padrão: todos os núcleos)")
+    gerar.add_argument("--sem-cache", action="store_true", help="não usa o cache de XMLs")
+    gerar.add_argument("--todos-xmls", action="store_true",
+                       help="parseia todos os XMLs da pasta, e não só os das chaves dos C100 do SPED")
+    gerar.add_argument("--sem-reparo", action="store_true",
+                       help="não tenta reparar XMLs mal formados (um XML inválido interrompe a leitura)")
+    gerar.add_argument("--completo", action="store_true",
+                       help="reprocessa o SPED inteiro, sem o modo incremental")
+    gerar.add_argument("--relatorio", metavar="JSON",
+                       help="grava tempo, itens e bytes de cada etapa num relatório JSON")
+    gerar.add_argument("--memoria", action="store_true",
+                       help="com --relatorio, mede também o pico de memória de cada etapa (mais lento)")
+    gerar.add_argument("--perfil", metavar="PROF",
+                       help="grava um perfil cProfile da execução (ver pstats/snakeviz)")
+    gerar.set_defaults(funcao=_gerar)
+
+    lote = sub.add_parser("lote", help="processa vários trabalhos de um manifesto JSON")
+    lote.add_argument("manifesto", help="JSON com a lista de trabalhos")
+    lote.add_argument("-p", "--processos", type=int, default=None,
+                      help="quantidade de trabalhos simultâneos (padrão: todos os núcleos)")
+    lote.add_argument("-v", "--detalhado", action="store_true", default=argparse.SUPPRESS,
+                      help="log detalhado (DEBUG) em cada <saida>.log")
+    lote.set_defaults(funcao=_lote)
+
+    reparar = sub.add_parser("reparar", help="verifica e repara os XMLs mal formados de uma pasta")
+    reparar.add_argument("pasta", help="pasta com os XMLs")
+    reparar.add_argument("-p", "--processos", type=int, default=None,
+                         help="processos (padrão: todos os núcleos)")
+    reparar.set_defaults(funcao=_reparar)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.detalhado else logging.INFO, format="%(message)s")
+    return args.funcao(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import io
+import logging
+import os
+import zipfile
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# ---------------- XMLs DENTRO DE .ZIP ----------------
+#
+# Um XML dentro de um .zip é identificado pela sua origem: a tupla
+# (caminho do .zip, zips internos..., membro). Os membros são lidos direto
+# do zip, sem extrair para o disco. Cada processo abre cada zip uma única
+# vez (o diretório central de um zip com dezenas de milhares de arquivos
+# não é barato) e guarda os zips internos em memória.
+
+_abertos = {}
+_dono = None
+
+# Erros de um zip corrompido ou de um membro danificado (CRC, dados
+# truncados, compressão desconhecida, membro com senha)
+ERROS_ZIP = (zipfile.BadZipFile, zlib.error, EOFError, OSError, NotImplementedError, RuntimeError)
+
+
+def _abrir(origem):
+    """ZipFile do zip (ou zip interno) identificado pela tupla `origem`."""
+    global _dono
+    if _dono != os.getpid():
+        # Processo filho (fork): não compartilha os arquivos abertos do pai
+        _abertos.clear()
+        _dono = os.getpid()
+    zf = _abertos.get(origem)
+    if zf is None:
+        if len(origem) == 1:
+            zf = zipfile.ZipFile(origem[0])
+        else:
+            zf = zipfile.ZipFile(io.BytesIO(_abrir(origem[:-1]).read(origem[-1])))
+        _abertos[origem] = zf
+    return zf
+
+
+def fechar_zips():
+    for zf in _abertos.values():
+        zf.close()
+    _abertos.clear()
+
+
+def eh_zip(caminho):
+    return caminho.lower().endswith(".zip") and os.path.isfile(caminho)
+
+
+def listar_zip(caminho_zip, prefixo=""):
+    """
+    Os .xml do zip, descendo nos .zip internos, como tuplas
+    (nome, crc, tamanho, origem). O nome é o caminho do membro com o
+    `prefixo` na frente (e "interno.zip/" para os de um zip interno); o CRC
+    faz o papel do mtime no cache. Um zip (ou zip interno) que não abre
+    fica de fora com um aviso.
+    """
+    itens = []
+    _listar((caminho_zip,), prefixo, itens)
+    return itens
+
+
+def _listar(origem_zip, prefixo, itens):
+    try:
+        infos = _abrir(origem_zip).infolist()
+    except ERROS_ZIP as e:
+        logger.warning("❌ ZIP ignorado: %s | %s", "/".join(origem_zip), e)
+        return
+    for info in infos:
+        if info.is_dir():
+            continue
+        nome = info.filename
+        if nome.lower().endswith(".xml"):
+            itens.append((prefixo + nome, info.CRC, info.file_size, origem_zip + (nome,)))
+        elif nome.lower().endswith(".zip"):
+            _listar(origem_zip + (nome,), prefixo + nome + "/", itens)
+
+
+def ler_membro(origem):
+    """Conteúdo (bytes) do XML com essa origem."""
+    return _abrir(origem[:-1]).read(origem[-1])
+
+
+def inicio_membro(origem, tamanho):
+    """Os primeiros `tamanho` bytes do membro, descompactando só o começo."""
+    with _abrir(origem[:-1]).open(origem[-1]) as f:
+        return f.read(tamanho)
@@ -1,62 +1,160 @@
+"""
+Reparo de XMLs mal formados (caracteres de controle, bytes inválidos).
+
+    python formatacao.py PASTA [-p PROCESSOS]
+
+Cada arquivo passa primeiro por uma verificação rápida (expat, sem montar
+a árvore); só os que falham são reparados, e o reparo só é gravado se o
+resultado for um XML bem formado, num temporário renomeado por cima do
+original. ler_xml_notas usa reparar_xml sozinho quando um XML não abre.
+"""
+import codecs
+import logging
 import os
-import xml.etree.ElementTree as ET
 import re
+import shutil
+import sys
+import tempfile
+from collections import Counter
+from xml.parsers import expat
+
+from progresso import mapear
+
+logger = logging.getLogger(__name__)
+
+# ---------------- REPARO DE XML ----------------
+
+# faixa de caracteres válidos para XML: https://www.w3.org/TR/xml/#charsets
+_INVALIDOS = re.compile(r'[^\x09\x0A\x0D\x20-\uD7FF\uE000-\uFFFD\U00010000-\U0010FFFF]')
+
+_CODIFICACAO = re.compile(rb'^\s*<\?xml[^>]*encoding\s*=\s*["\']([A-Za-z0-9._-]+)["\']')
 
-pasta_xml = r"F:/2025/07.2025/NOTAS/MABE ESTRUTURAS/ENTRADAS"
 
 def limpar_caracteres_invalidos(texto):
     """
     Remove caracteres inválidos para XML (controle, não UTF-8 válidos, etc).
     Mantém apenas caracteres válidos para XML 1.0.
     """
-    # faixa de caracteres válidos para XML: https://www.w3.org/TR/xml/#charsets
-    return re.sub(
-        r'[^\x09\x0A\x0D\x20-\uD7FF\uE000-\uFFFD]',
-        '', texto
-    )
+    return _INVALIDOS.sub('', texto)
+
+
+def verificar_xml(dados):
+    """None se `dados` (bytes) é um XML bem formado; senão o expat.ExpatError."""
+    parser = expat.ParserCreate()
+    try:
+        parser.Parse(dados, True)
+    except expat.ExpatError as e:
+        return e
+    return None
 
-for arquivo in os.listdir(pasta_xml):
-    if arquivo.lower().endswith(".xml"):
-        caminho = os.path.join(pasta_xml, arquivo)
+
+def _codificacao(dados):
+    """Codificação declarada no <?xml ...?> (utf-8 se ausente ou desconhecida)."""
+    m = _CODIFICACAO.match(dados[:200])
+    if m:
         try:
-            ET.parse(caminho)
-        except ET.ParseError as e:
-            # Extrair linha e coluna do erro
-            m = re.search(r'line (\d+), column (\d+)', str(e))
-            if m:
-                linha_err = int(m.group(1))
-                col_err = int(m.group(2))
-            else:
-                linha_err = col_err = None
-
-            print(f"❌ Erro no XML: {arquivo} | {e}")
-
-            # Tentar corrigir
-            with open(caminho, 'r', encoding='utf-8', errors='ignore') as f:
-                linhas = f.readlines()
-
-            if linha_err and linha_err <= len(linhas):
-                # remover caractere problemático na coluna
-                linha_original = linhas[linha_err - 1]
-                if col_err and col_err <= len(linha_original):
-                    linha_corrigida = linha_original[:col_err - 1] + linha_original[col_err:]
-                    linhas[linha_err - 1] = linha_corrigida
-                    print(f"🛠 Corrigido caractere na linha {linha_err}, coluna {col_err}")
-
-            # Limpar caracteres inválidos de todas as linhas
-            linhas = [limpar_caracteres_invalidos(l) for l in linhas]
-
-            # Salvar arquivo corrigido (sobrescreve original)
-            with open(caminho, 'w', encoding='utf-8') as f:
-                f.writelines(linhas)
-
-            # Testar novamente
-            try:
-                ET.parse(caminho)
-            except ET.ParseError as e2:
-                print(f"❌ Ainda com erro: {arquivo} | {e2}")
-            else:
-                print(f"✅ Corrigido: {arquivo}")
-
-        else:
-            print(f"✅ OK: {arquivo}")
+            return codecs.lookup(m.group(1).decode("ascii")).name
+        except LookupError:
+            pass
+    return "utf-8"
+
+
+def _remover_no_erro(texto, erro):
+    """Tira o caractere na linha/coluna apontada pelo parser."""
+    linhas = texto.splitlines(keepends=True)
+    if not 1 <= erro.lineno <= len(linhas):
+        return texto
+    linha = linhas[erro.lineno - 1]
+    if erro.offset < len(linha):
+        linhas[erro.lineno - 1] = linha[:erro.offset] + linha[erro.offset + 1:]
+    return "".join(linhas)
+
+
+def _gravar_atomico(caminho, dados):
+    """Grava num temporário da mesma pasta e renomeia por cima do original."""
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    descritor, temporario = tempfile.mkstemp(dir=pasta, prefix=".reparo-", suffix=".tmp")
+    try:
+        with os.fdopen(descritor, "wb") as f:
+            f.write(dados)
+        shutil.copymode(caminho, temporario)
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+
+def reparar_conteudo(dados):
+    """
+    Verifica o XML (bytes) e, se estiver mal formado, tenta repará-lo:
+    1. tira os bytes que não valem na codificação declarada e os
+       caracteres fora da faixa do XML 1.0;
+    2. se ainda falhar, tira o caractere apontado pelo erro.
+
+    Devolve (situação, mensagem, conteúdo): ("ok", None, None) se já estava
+    bem formado, ("corrigido", erro original, conteúdo reparado) ou
+    ("erro", erro que restou, None).
+    """
+    erro = verificar_xml(dados)
+    if erro is None:
+        return "ok", None, None
+
+    codificacao = _codificacao(dados)
+    texto = limpar_caracteres_invalidos(dados.decode(codificacao, errors="ignore"))
+    corrigido = texto.encode(codificacao, errors="ignore")
+    restante = verificar_xml(corrigido)
+    if restante is not None:
+        corrigido = _remover_no_erro(texto, restante).encode(codificacao, errors="ignore")
+        restante = verificar_xml(corrigido)
+    if restante is not None:
+        return "erro", str(restante), None
+    return "corrigido", str(erro), corrigido
+
+
+def reparar_xml(caminho):
+    """
+    reparar_conteudo sobre um arquivo. Devolve (situação, mensagem); o
+    arquivo só é regravado quando a situação é "corrigido".
+    """
+    with open(caminho, "rb") as f:
+        situacao, mensagem, corrigido = reparar_conteudo(f.read())
+    if situacao == "corrigido":
+        _gravar_atomico(caminho, corrigido)
+    return situacao, mensagem
+
+
+def reparar_pasta(pasta_xml, processos=None, progresso=None):
+    """
+    Verifica e repara os .xml da pasta (processos=None usa todos os
+    núcleos). Devolve um Counter com a quantidade de arquivos "ok",
+    "corrigido" e "erro". `progresso("xml", feitos, total, None)` é chamado
+    a cada arquivo.
+    """
+    with os.scandir(pasta_xml) as entradas:
+        nomes = sorted(e.name for e in entradas if e.name.lower().endswith(".xml") and e.is_file())
+    logger.info("🔎 Verificando %d XMLs em: %s", len(nomes), pasta_xml)
+
+    situacoes = Counter()
+    caminhos = [os.path.join(pasta_xml, nome) for nome in nomes]
+    for feitos, (nome, (situacao, mensagem)) in enumerate(
+        zip(nomes, mapear(reparar_xml, caminhos, processos)), 1
+    ):
+        situacoes[situacao] += 1
+        if situacao == "corrigido":
+            logger.info("🛠 Corrigido: %s (%s)", nome, mensagem)
+        elif situacao == "erro":
+            logger.warning("❌ Ainda com erro: %s | %s", nome, mensagem)
+        if progresso is not None:
+            progresso("xml", feitos, len(nomes), None)
+
+    logger.info("✅ %d XMLs ok, %d corrigidos, %d com erro.",
+                situacoes["ok"], situacoes["corrigido"], situacoes["erro"])
+    return situacoes
+
+
+if __name__ == "__main__":
+    # O mesmo que `python cli.py reparar PASTA`
+    from cli import main
+
+    sys.exit(main(["reparar", *sys.argv[1:]]))
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import os
+from collections import Counter
+
+from cfops import compilar_cfops
+from notas import nota_para_json
+from progresso import INTERVALO_LINHAS
+from relatorio import etapa
+from sped import (
+    MODO_EXISTENTES,
+    MODOS_EXISTENTES,
+    POLITICA_PARCIAL,
+    POLITICAS_PARCIAL,
+    fracao_a_prazo,
+    gerar_c140_c141,
+    gravar_bloco9,
+    linha_encerramento,
+    processar_sped,
+    validar_opcao,
+)
+from varredura import detectar_fim_linha
+
+logger = logging.getLogger(__name__)
+
+# ---------------- REPROCESSAMENTO INCREMENTAL ----------------
+
+VERSAO_ESTADO = 4
+
+
+def _assinatura(nota, fracao):
+    """
+    Resume as entradas que decidem os C140/C141 de um C100: a nota do XML
+    (ou a ausência dela) e a parte a prazo do documento (fracao_a_prazo).
+    """
+    conteudo = "sem-xml" if nota is None else nota_para_json(nota)
+    return hashlib.sha1(f"{fracao}|{conteudo}".encode("utf-8")).hexdigest()
+
+
+def _identificar(caminho):
+    st = os.stat(caminho)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _carregar_estado(caminho_estado):
+    try:
+        with open(caminho_estado, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _salvar_estado(caminho_estado, arquivo_sped, saida_sped, grupos, existentes):
+    estado = {
+        "versao": VERSAO_ESTADO,
+        "existentes": existentes,
+        "entrada": [os.path.abspath(arquivo_sped)] + _identificar(arquivo_sped),
+        "saida": _identificar(saida_sped),
+        "grupos": grupos,
+    }
+    with open(caminho_estado, "w", encoding="utf-8") as f:
+        json.dump(estado, f)
+
+
+def _estado_valido(estado, arquivo_sped, saida_sped, existentes):
+    """
+    O estado só serve se a entrada e a saída anteriores não mudaram e os
+    C140/C141 existentes foram tratados do mesmo jeito.
+    """
+    if not estado or estado.get("versao") != VERSAO_ESTADO or estado.get("existentes") != existentes:
+        return False
+    if not os.path.exists(saida_sped):
+        return False
+    return (
+        estado["entrada"] == [os.path.abspath(arquivo_sped)] + _identificar(arquivo_sped)
+        and estado["saida"] == _identificar(saida_sped)
+    )
+
+
+def processar_sped_incremental(arquivo_sped, notas_xml, saida_sped, cfops_avista=(), progresso=None,
+                               politica=POLITICA_PARCIAL, existentes=MODO_EXISTENTES, relatorio=None,
+                               canceladas=()):
+    """
+    Igual a processar_sped, mas guarda em <saida>.estado.json de onde veio
+    cada C140/C141: numa nova execução só os C100 cuja nota ou parte a
+    prazo mudou são recalculados, e o resto da saída anterior é copiado.
+    """
+    validar_opcao("parcial", politica, POLITICAS_PARCIAL)
+    validar_opcao("existentes", existentes, MODOS_EXISTENTES)
+    cfops_avista = compilar_cfops(cfops_avista)
+    caminho_estado = saida_sped + ".estado.json"
+    estado = _carregar_estado(caminho_estado)
+
+    if not _estado_valido(estado, arquivo_sped, saida_sped, existentes):
+        grupos = []
+        processar_sped(arquivo_sped, notas_xml, saida_sped, cfops_avista, grupos=grupos, progresso=progresso,
+                       politica=politica, existentes=existentes, relatorio=relatorio,
+                       canceladas=canceladas)
+        for grupo in grupos:
+            _, chave, resumo, _ = grupo
+            grupo.append(_assinatura(notas_xml.get(chave), fracao_a_prazo(resumo, cfops_avista, politica)))
+        _salvar_estado(caminho_estado, arquivo_sped, saida_sped, grupos, existentes)
+        return
+
+    grupos = estado["grupos"]
+    alterados = {}
+    for i, (_, chave, resumo, _, assinatura) in enumerate(grupos):
+        fracao = fracao_a_prazo(resumo, cfops_avista, politica)
+        nova = _assinatura(notas_xml.get(chave), fracao)
+        if nova != assinatura:
+            grupos[i][4] = nova
+            alterados[i] = fracao
+
+    logger.info("♻️ Modo incremental: %d de %d documentos mudaram.", len(alterados), len(grupos))
+    if not alterados:
+        logger.info("✅ SPED corrigido já está atualizado: %s", saida_sped)
+        return
+
+    with etapa(relatorio, "incremental.reaproveitar") as medida:
+        medida["bytes_lidos"] += os.path.getsize(saida_sped)
+        _reaproveitar_saida(saida_sped, notas_xml, grupos, alterados, progresso)
+        medida["itens"] += len(alterados)
+        medida["bytes_gravados"] += os.path.getsize(saida_sped)
+    _salvar_estado(caminho_estado, arquivo_sped, saida_sped, grupos, existentes)
+    logger.info("✅ SPED corrigido atualizado em: %s", saida_sped)
+
+
+def _reaproveitar_saida(saida_sped, notas_xml, grupos, alterados, progresso=None):
+    """
+    Regrava a saída anterior trocando apenas os C140/C141 dos grupos
+    alterados (índice -> fração a prazo). Atualiza em `grupos` a nova posição e quantidade de cada um.
+    Os X990 e o Bloco 9 saem da contagem dos registros regravados; o fim
+    de linha (CRLF ou LF) da saída anterior é mantido.
+    """
+    temporario = saida_sped + ".tmp"
+    contagem = Counter()
+    total_linhas = 0
+    proximo = 0
+    idx_anterior = -1
+    tamanho = os.path.getsize(saida_sped)
+    bytes_lidos = 0
+
+    with open(saida_sped, "rb") as f:
+        fim_linha = detectar_fim_linha(f.readline())
+
+    try:
+        with open(saida_sped, "r", encoding="latin1") as anterior, \
+                open(temporario, "w", encoding="latin1", newline=fim_linha) as saida:
+            linhas = iter(anterior)
+            for linha in linhas:
+                idx_anterior += 1
+                bytes_lidos += len(linha)
+                if progresso is not None and idx_anterior % INTERVALO_LINHAS == 0:
+                    progresso("sped", bytes_lidos, tamanho, {"linhas": idx_anterior})
+
+                registro = linha[1:5]
+                if registro == "9001":
+                    break
+                if registro[1:] == "990":
+                    linha = linha_encerramento(registro, contagem)
+
+                saida.write(linha)
+                contagem[registro] += 1
+                total_linhas += 1
+
+                if proximo >= len(grupos) or grupos[proximo][0] != idx_anterior:
+                    continue
+
+                grupo = grupos[proximo]
+                grupo[0] = total_linhas - 1
+                if proximo in alterados:
+                    qtd_anterior = grupo[3]
+                    for _ in range(qtd_anterior):
+                        next(linhas)
+                    idx_anterior += qtd_anterior
+                    campos = linha.strip().split("|")
+                    registros = gerar_c140_c141(campos, alterados[proximo], notas_xml)
+                    saida.writelines(registros)
+                    for novo in registros:
+                        contagem[novo[1:5]] += 1
+                    total_linhas += len(registros)
+                    grupo[3] = len(registros)
+                proximo += 1
+
+            # ---------------- Gerar bloco 9 ----------------
+            gravar_bloco9(saida, contagem)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+    os.replace(temporario, saida_sped)
@@ -0,0 +1,145 @@
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cfops import CFOPS_FILE, CFOPS_PADRAO, carregar_cfops
+from incremental import processar_sped_incremental
+from sped import MODO_EXISTENTES, POLITICA_PARCIAL, chaves_do_sped
+from xml_notas import ler_xml_notas
+
+logger = logging.getLogger(__name__)
+
+# ---------------- PROCESSAMENTO EM LOTE ----------------
+
+CAMPOS_OBRIGATORIOS = ("pasta_xml", "sped", "saida")
+
+
+def carregar_manifesto(caminho):
+    """
+    Lê o manifesto do lote: uma lista JSON de trabalhos, cada um com
+    pasta_xml (pasta ou .zip), sped, saida e, opcionalmente, nome, cfops (lista de CFOPs
+    "à vista" ou caminho de um JSON com a lista) e parcial (política para
+    documentos mistos, ver sped.fracao_a_prazo) e existentes (C140/C141
+    que já vêm no SPED, ver sped.processar_documento). Caminhos relativos são
+    resolvidos a partir da pasta do manifesto, inclusive o cfops_avista.json
+    padrão (sem ele, cfops.CFOPS_PADRAO). Um trabalho sem os campos
+    obrigatórios fica marcado em "invalido" e sai com erro no relatório.
+    """
+    with open(caminho, "r", encoding="utf-8") as f:
+        trabalhos = json.load(f)
+
+    base = os.path.dirname(os.path.abspath(caminho))
+    padrao = os.path.join(base, CFOPS_FILE)
+    for i, trabalho in enumerate(trabalhos):
+        if not isinstance(trabalho, dict):
+            trabalhos[i] = {"nome": f"#{i + 1}", "invalido": "o trabalho deve ser um objeto JSON"}
+            continue
+        faltando = [campo for campo in CAMPOS_OBRIGATORIOS if not trabalho.get(campo)]
+        if faltando:
+            trabalho["invalido"] = f"faltam campos no manifesto: {', '.join(faltando)}"
+        for campo in CAMPOS_OBRIGATORIOS:
+            if trabalho.get(campo):
+                trabalho[campo] = os.path.normpath(os.path.join(base, trabalho[campo]))
+        if "cfops" not in trabalho:
+            trabalho["cfops"] = padrao if os.path.exists(padrao) else list(CFOPS_PADRAO)
+        elif isinstance(trabalho["cfops"], str):
+            trabalho["cfops"] = os.path.normpath(os.path.join(base, trabalho["cfops"]))
+        sped = trabalho.get("sped")
+        trabalho.setdefault("nome", f"#{i + 1} {os.path.basename(sped)}" if sped else f"#{i + 1}")
+    return trabalhos
+
+
+def _cfops_do_trabalho(trabalho):
+    cfops = trabalho["cfops"]
+    if isinstance(cfops, str):
+        return carregar_cfops(cfops)
+    return cfops
+
+
+def executar_trabalho(trabalho, nivel=logging.INFO):
+    """
+    Roda um trabalho do lote (XMLs + SPED). O log do trabalho (no `nivel`
+    pedido) vai só para <saida>.log. Nunca levanta exceção: o erro volta no
+    resultado para não derrubar o restante do lote.
+    """
+    inicio = time.perf_counter()
+    resultado = {"nome": trabalho["nome"], "status": "ok", "erro": None, "notas": 0}
+    if trabalho.get("invalido"):
+        resultado.update(status="erro", erro=f"ValueError: {trabalho['invalido']}", tempo=0.0)
+        return resultado
+    raiz = logging.getLogger()
+    handlers_antes, nivel_antes = raiz.handlers[:], raiz.level
+    handler = None
+    try:
+        handler = logging.FileHandler(trabalho["saida"] + ".log", mode="w", encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        raiz.handlers = [handler]
+        raiz.setLevel(nivel)
+
+        cfops_avista = _cfops_do_trabalho(trabalho)
+        canceladas = set()
+        notas = ler_xml_notas(trabalho["pasta_xml"], chaves=chaves_do_sped(trabalho["sped"]),
+                              canceladas=canceladas)
+        resultado["notas"] = len(notas)
+        processar_sped_incremental(
+            trabalho["sped"], notas, trabalho["saida"], cfops_avista,
+            politica=trabalho.get("parcial", POLITICA_PARCIAL),
+            existentes=trabalho.get("existentes", MODO_EXISTENTES),
+            canceladas=canceladas,
+        )
+    except Exception as e:
+        logger.exception("❌ Erro no trabalho %s", trabalho["nome"])
+        resultado["status"] = "erro"
+        resultado["erro"] = f"{type(e).__name__}: {e}"
+    finally:
+        raiz.handlers, raiz.level = handlers_antes, nivel_antes
+        if handler is not None:
+            handler.close()
+    resultado["tempo"] = time.perf_counter() - inicio
+    return resultado
+
+
+def executar_lote(trabalhos, processos=None, nivel=logging.INFO):
+    """
+    Executa os trabalhos num pool de processos (processos=None usa todos os
+    núcleos) e devolve os resultados na ordem do manifesto.
+    """
+    resultados = [None] * len(trabalhos)
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        futuros = {pool.submit(executar_trabalho, t, nivel): i for i, t in enumerate(trabalhos)}
+        for futuro in as_completed(futuros):
+            i = futuros[futuro]
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                # O processo do trabalho morreu (ex.: falta de memória)
+                resultado = {"nome": trabalhos[i]["nome"], "status": "erro",
+                             "erro": f"{type(e).__name__}: {e}", "notas": 0, "tempo": 0.0}
+            resultados[i] = resultado
+            simbolo = "✅" if resultado["status"] == "ok" else "❌"
+            print(f"{simbolo} {resultado['nome']} ({resultado['tempo']:.1f}s)")
+    return resultados
+
+
+def imprimir_relatorio(resultados):
+    print("\n📊 Relatório do lote")
+    print(f"{'trabalho':<40} {'status':<6} {'notas':>7} {'tempo (s)':>10}  erro")
+    for r in resultados:
+        print(f"{r['nome'][:40]:<40} {r['status']:<6} {r['notas']:>7} {r['tempo']:>10.1f}  {r['erro'] or ''}")
+    erros = sum(1 for r in resultados if r["status"] != "ok")
+    total = sum(r["tempo"] for r in resultados)
+    print(f"\n{len(resultados) - erros} ok, {erros} com erro, {total:.1f}s somados.")
+
+
+def main(argv=None):
+    """O mesmo que `python cli.py lote ...`."""
+    from cli import main as cli_main
+
+    return cli_main(["lote", *(sys.argv[1:] if argv is None else argv)])
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
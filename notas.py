@@ -0,0 +1,104 @@
+import json
+import re
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_EVEN, Decimal, InvalidOperation
+from functools import lru_cache
+
+# ---------------- REGISTROS DE NOTAS ----------------
+#
+# Uma nota lida do XML vira uma tupla nomeada, sem dicionário por
+# instância; as duplicatas já vêm no formato que o C141 grava:
+#   numero:     nDup normalizado em 2 dígitos ("01".."99")
+#   vencimento: dVenc como ddmmaaaa
+#   centavos:   vDup em centavos (int), sem float no caminho
+
+Nota = namedtuple("Nota", "numero emissao duplicatas")
+Nota.__doc__ = "nNF, data de emissão (date ou None) e tupla de Duplicata."
+
+Duplicata = namedtuple("Duplicata", "numero vencimento centavos")
+Duplicata.__doc__ = "Parcela pronta para o C141 (ver o topo de notas.py)."
+
+_NAO_DIGITOS = re.compile(r"\D")
+_CENTAVO = Decimal("0.01")
+
+
+@lru_cache(maxsize=1024)
+def numero_parcela(valor):
+    """
+    Normaliza número de parcela para 2 dígitos (01..99).
+    Remove não-dígitos, converte para int e volta em 2 dígitos.
+    Se não der pra converter, retorna '01'.
+    """
+    digitos = _NAO_DIGITOS.sub("", str(valor or ""))
+    try:
+        return f"{int(digitos):02d}"
+    except ValueError:
+        return "01"
+
+
+def centavos(valor):
+    """Valor em texto ("1034.81" do XML ou "1034,81" do SPED) em centavos."""
+    texto = valor.strip().replace(",", ".")
+    inteiros, _, fracao = texto.partition(".")
+    if len(fracao) == 2 and fracao.isdigit() and inteiros.lstrip("-").isdigit():
+        return int(inteiros + fracao)  # caso comum, sem Decimal
+    try:
+        return int(Decimal(texto).quantize(_CENTAVO, ROUND_HALF_EVEN) * 100)
+    except InvalidOperation:
+        raise ValueError(f"valor inválido: {valor!r}") from None
+
+
+def formatar_centavos(valor):
+    """Centavos no formato do SPED ("1034,81")."""
+    sinal = "-" if valor < 0 else ""
+    inteiros, resto = divmod(abs(valor), 100)
+    return f"{sinal}{inteiros},{resto:02d}"
+
+
+def nova_duplicata(n_dup, d_venc, v_dup):
+    """
+    Duplicata a partir dos textos de nDup, dVenc (ISO) e vDup do XML.
+    ValueError se faltar dVenc/vDup ou se algum deles for inválido.
+    """
+    if d_venc is None or v_dup is None:
+        raise ValueError("duplicata sem dVenc ou vDup")
+    return Duplicata(numero_parcela(n_dup), _vencimento(d_venc), centavos(v_dup))
+
+
+@lru_cache(maxsize=4096)
+def _vencimento(d_venc):
+    """dVenc ISO como ddmmaaaa; o cache faz datas repetidas virarem a mesma str."""
+    data = datetime.fromisoformat(d_venc)
+    return f"{data.day:02d}{data.month:02d}{data.year:04d}"
+
+
+def duplicata_ficticia(emissao, valor_documento):
+    """
+    Parcela única, 30 dias após a emissão, para a nota sem cobr/dup.
+    ValueError se a nota não tem data de emissão ou o valor é inválido.
+    """
+    if emissao is None:
+        raise ValueError("nota sem data de emissão")
+    vencimento = (emissao + timedelta(days=30)).strftime("%d%m%Y")
+    return Duplicata("01", vencimento, centavos(valor_documento))
+
+
+def nota_para_json(nota):
+    """Nota em JSON (lista), como fica no cache de XMLs; None vira "null"."""
+    if nota is None:
+        return "null"
+    emissao = nota.emissao
+    return json.dumps([nota.numero, emissao.isoformat() if emissao is not None else None, nota.duplicatas])
+
+
+def nota_de_json(texto):
+    """Inverso de nota_para_json."""
+    if texto == "null":
+        return None
+    numero, emissao, duplicatas = json.loads(texto)
+    return Nota(
+        numero,
+        date.fromisoformat(emissao) if emissao is not None else None,
+        tuple(Duplicata(*d) for d in duplicatas),
+    )
@@ -0,0 +1,44 @@
+import os
+
+# ---------------- PROGRESSO / CANCELAMENTO ----------------
+
+# De quantas em quantas linhas do SPED o callback de progresso é chamado
+INTERVALO_LINHAS = 5000
+
+
+class ProcessamentoCancelado(Exception):
+    """
+    Levantada pelo callback de progresso para interromper o processamento.
+
+    O callback recebe (etapa, feitos, total, extra): etapa "xml" conta
+    arquivos, etapa "sped" conta bytes lidos do SPED e traz em `extra` as
+    linhas lidas e os C140/C141 gerados até o momento.
+    """
+
+
+# ---------------- POOL DE PROCESSOS ----------------
+
+
+def mapear(funcao, itens, processos=None):
+    """
+    funcao(item) para cada item, em série ou num pool de processos
+    (processos=None usa todos os núcleos), na ordem recebida. Se quem
+    consome parar no meio (cancelamento), o que ainda não começou no pool
+    é descartado.
+    """
+    if processos is None:
+        processos = os.cpu_count() or 1
+
+    if processos > 1 and len(itens) > 1:
+        # Importado aqui para não pesar na partida de quem só usa as constantes
+        from concurrent.futures import ProcessPoolExecutor
+
+        chunksize = max(1, len(itens) // (processos * 8))
+        pool = ProcessPoolExecutor(max_workers=processos)
+        try:
+            yield from pool.map(funcao, itens, chunksize=chunksize)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+    else:
+        for item in itens:
+            yield funcao(item)
@@ -0,0 +1,102 @@
+# ---------------- REGRAS DOS REGISTROS ----------------
+#
+# Cada registro do SPED que precisa ser alterado declara aqui o que muda:
+#   tamanho_minimo: quantidade mínima de campos (separados por "|",
+#                   campos[1] é o código do registro); faltando, completa
+#                   com vazios
+#   zerar:          índices dos campos que passam a "0,00"
+#   reescrever:     {índice: valor fixo}
+#
+# As regras são compiladas uma única vez (compilar_regras) em funções por
+# registro; o processamento só faz REGRAS_COMPILADAS.get(registro).
+
+ZERO = "0,00"
+
+REGRAS = {
+    "C100": {
+        "tamanho_minimo": 35,
+        "zerar": (
+            21,  # VL_BC_ICMS
+            22,  # VL_ICMS
+            23,  # VL_BC_ICMS_ST
+            24,  # VL_ICMS_ST
+            25,  # VL_IPI
+            26,  # VL_PIS
+            27,  # VL_COFINS
+            28,  # VL_PIS_ST
+            29,  # VL_COFINS_ST
+        ),
+    },
+    "C190": {
+        "tamanho_minimo": 23,
+        "zerar": (
+            4,   # ALIQ_ICMS
+            # 5 = VL_OPR (valor contábil): NUNCA ZERAR
+            6,   # VL_BC_ICMS
+            7,   # VL_ICMS
+            8,   # VL_BC_ICMS_ST
+            9,   # VL_ICMS_ST
+            10,  # VL_RED_BC
+            11,  # VL_IPI
+        ),
+        #|C190|051|1910|0,00|1034,81|0,00|0,00|0,00|0,00|0,00|0,00||||||||| (exemplo de C190 zerado)
+    },
+}
+
+
+def _fatias(valores):
+    """
+    Junta os campos alterados em fatias contíguas (início, fim, novos
+    valores), para que cada faixa seja trocada numa única atribuição.
+    """
+    fatias = []
+    for indice in sorted(valores):
+        if fatias and fatias[-1][1] == indice:
+            inicio, _, novos = fatias[-1]
+            novos.append(valores[indice])
+            fatias[-1] = (inicio, indice + 1, novos)
+        else:
+            fatias.append((indice, indice + 1, [valores[indice]]))
+    return fatias
+
+
+def compilar_regra(regra):
+    """
+    Transforma a declaração de um registro numa função que recebe uma
+    lista de linhas (cada uma já separada em campos) e altera todas no
+    lugar.
+    """
+    valores = dict.fromkeys(regra.get("zerar", ()), ZERO)
+    valores.update(regra.get("reescrever", {}))
+    fatias = _fatias(valores)
+
+    tamanho = regra.get("tamanho_minimo", 0)
+    if fatias:
+        tamanho = max(tamanho, fatias[-1][1])
+    vazios = [""] * tamanho
+
+    if len(fatias) == 1:
+        (inicio, fim, novos), = fatias
+
+        def aplicar(linhas):
+            for campos in linhas:
+                if len(campos) < tamanho:
+                    campos.extend(vazios[len(campos):])
+                campos[inicio:fim] = novos
+    else:
+        def aplicar(linhas):
+            for campos in linhas:
+                if len(campos) < tamanho:
+                    campos.extend(vazios[len(campos):])
+                for inicio, fim, novos in fatias:
+                    campos[inicio:fim] = novos
+
+    return aplicar
+
+
+def compilar_regras(regras=REGRAS):
+    """registro -> função compilada (compilar_regra)."""
+    return {registro: compilar_regra(regra) for registro, regra in regras.items()}
+
+
+REGRAS_COMPILADAS = compilar_regras()
@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# ---------------- RELATÓRIO DE EXECUÇÃO ----------------
+
+
+def _nova_etapa():
+    return {"tempo": 0.0, "itens": 0, "bytes_lidos": 0, "bytes_gravados": 0, "pico_memoria": None}
+
+
+class Relatorio:
+    """
+    Junta, por etapa (xml.listagem, xml.parse, sped.varredura,
+    sped.bloco9...), tempo de relógio, itens tratados, bytes
+    lidos/gravados e, com memoria=True, o pico de memória Python
+    (tracemalloc) da etapa.
+
+    As funções de processamento recebem `relatorio=None`; sem relatório
+    nada é medido. Uma etapa aberta várias vezes (ex.: uma por documento
+    C100) soma os tempos, e etapas podem ficar uma dentro da outra.
+    """
+
+    def __init__(self, memoria=False):
+        self.etapas = {}
+        self.dados = {}
+        self.memoria = memoria
+        self.inicio = datetime.now()
+        self._relogio = time.perf_counter()
+        self._abertas = []
+        if memoria and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _etapa(self, nome):
+        if nome not in self.etapas:
+            self.etapas[nome] = _nova_etapa()
+        return self.etapas[nome]
+
+    def _registrar_pico(self):
+        """Leva o pico de memória desde o último reset a todas as etapas abertas."""
+        pico = tracemalloc.get_traced_memory()[1]
+        for aberta in self._abertas:
+            aberta["pico_memoria"] = max(aberta["pico_memoria"] or 0, pico)
+
+    @contextmanager
+    def etapa(self, nome):
+        """Mede o bloco `with`; o dicionário da etapa é entregue para somar itens e bytes."""
+        etapa = self._etapa(nome)
+        if self.memoria:
+            self._registrar_pico()
+            tracemalloc.reset_peak()
+        self._abertas.append(etapa)
+        inicio = time.perf_counter()
+        try:
+            yield etapa
+        finally:
+            etapa["tempo"] += time.perf_counter() - inicio
+            if self.memoria:
+                self._registrar_pico()
+            self._abertas.pop()
+
+    def como_dict(self):
+        return {
+            "inicio": self.inicio.isoformat(timespec="seconds"),
+            "tempo_total": time.perf_counter() - self._relogio,
+            "pico_memoria_processo": pico_rss(),
+            "dados": self.dados,
+            "etapas": self.etapas,
+        }
+
+    def salvar(self, caminho):
+        """Grava o relatório em JSON e registra o resumo das etapas no log."""
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(self.como_dict(), f, indent=2, ensure_ascii=False)
+        for linha in self.resumo():
+            logger.info(linha)
+        logger.info("📊 Relatório de execução gravado em: %s", caminho)
+
+    def resumo(self):
+        """Linhas de texto com as etapas, da mais demorada para a menos."""
+        linhas = []
+        for nome, etapa in sorted(self.etapas.items(), key=lambda item: -item[1]["tempo"]):
+            texto = f"⏱️ {nome}: {etapa['tempo']:.3f}s"
+            if etapa["itens"]:
+                texto += f", {etapa['itens']} itens"
+            if etapa["bytes_lidos"]:
+                texto += f", {etapa['bytes_lidos'] / 2**20:.1f} MB lidos"
+            if etapa["bytes_gravados"]:
+                texto += f", {etapa['bytes_gravados'] / 2**20:.1f} MB gravados"
+            if etapa["pico_memoria"] is not None:
+                texto += f", pico {etapa['pico_memoria'] / 2**20:.1f} MB"
+            linhas.append(texto)
+        return linhas
+
+
+# Sem relatório todas as etapas dividem um contexto vazio (o que se soma nele se perde)
+_SEM_MEDIDA = nullcontext(_nova_etapa())
+
+
+def etapa(relatorio, nome):
+    """relatorio.etapa(nome), ou um contexto que não mede nada se relatorio for None."""
+    return relatorio.etapa(nome) if relatorio is not None else _SEM_MEDIDA
+
+
+def pico_rss():
+    """Pico de memória residente do processo em bytes (None fora do Unix)."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return pico if os.uname().sysname == "Darwin" else pico * 1024
+
+
+@contextmanager
+def perfil(caminho):
+    """
+    cProfile da thread atual durante o bloco `with`, gravado em `caminho`
+    (abrir com pstats ou snakeviz). Sem caminho não faz nada. Processos do
+    pool de XMLs não entram no perfil.
+    """
+    if not caminho:
+        yield
+        return
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(caminho)
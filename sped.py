@@ -0,0 +1,527 @@
+import logging
+import os
+import re
+from collections import Counter
+from fractions import Fraction
+
+from cfops import compilar_cfops
+from notas import centavos, duplicata_ficticia, formatar_centavos
+from progresso import INTERVALO_LINHAS
+from regras import REGRAS_COMPILADAS
+from relatorio import etapa
+from varredura import (
+    compilar_interesse,
+    contar_registros,
+    copiar_trecho,
+    detectar_fim_linha,
+    fim_da_linha,
+    fim_do_documento,
+    ler_janelas,
+)
+
+logger = logging.getLogger(__name__)
+
+# ---------------- FUNÇÕES SPED ----------------
+
+
+def separar_documento(grupo, regras=REGRAS_COMPILADAS):
+    """
+    Separa as linhas de um grupo que têm regra (regras.REGRAS): para cada
+    registro, as posições das linhas no grupo e os campos de cada uma. As
+    demais linhas (C170, C101...) não são separadas.
+    """
+    tabelas = {}
+    for i, linha in enumerate(grupo):
+        registro = linha[1:5]
+        if registro in regras:
+            if registro not in tabelas:
+                tabelas[registro] = ([], [])
+            posicoes, linhas = tabelas[registro]
+            posicoes.append(i)
+            linhas.append(_campos(linha))
+    return tabelas
+
+
+def _campos(linha):
+    """
+    Campos de uma linha "|REG|...|": campos[1] é o registro e o vazio
+    depois do último "|" fica de fora, para que serializar_linha devolva
+    a linha com a mesma quantidade de campos (reprocessar não acrescenta
+    campos).
+    """
+    campos = linha.strip().split("|")
+    if len(campos) > 2 and campos[-1] == "":
+        campos.pop()
+    return campos
+
+
+def serializar_linha(campos):
+    return "|".join(campos) + "|\n"
+
+
+def limpar_icms_c100_e_c190(linha):
+    """Aplica a regra do registro (C100, C190...) numa linha avulsa."""
+    campos = _campos(linha)
+    regra = REGRAS_COMPILADAS.get(campos[1] if len(campos) > 1 else "")
+    if regra is not None:
+        regra([campos])
+        logger.debug("%s zerado com sucesso: %s", campos[1], linha.rstrip("\n"))
+    else:
+        logger.warning("Linha sem regra: %s", linha.strip())
+    return serializar_linha(campos)
+
+
+def _registro(linha):
+    """Código do registro (ex.: 'C100') de uma linha '|C100|...'."""
+    return linha[1:5]
+
+
+def _centavos(valor):
+    """Valor do SPED ("1034,81") em centavos; vazio ou inválido vale 0."""
+    try:
+        return centavos(valor)
+    except ValueError:
+        return 0
+
+
+def resumir_cfops(c190):
+    """
+    Resumo dos CFOPs de um documento a partir de todos os seus C190 (já
+    separados em campos): CFOP -> soma do VL_OPR em centavos, na ordem em
+    que aparecem.
+    """
+    resumo = {}
+    for campos in c190:
+        if len(campos) > 3:
+            cfop = campos[3].strip()
+            resumo[cfop] = resumo.get(cfop, 0) + (_centavos(campos[5]) if len(campos) > 5 else 0)
+    return resumo
+
+
+# O que fazer com um documento que tem CFOPs à vista e a prazo
+POLITICAS_PARCIAL = ("integral", "proporcional", "nenhuma")
+POLITICA_PARCIAL = "integral"
+
+
+def validar_opcao(nome, valor, opcoes):
+    """ValueError se `valor` não é uma das `opcoes` (ex.: erro de digitação num manifesto)."""
+    if valor not in opcoes:
+        raise ValueError(f"valor inválido para {nome}: {valor!r} (use {', '.join(opcoes)})")
+
+
+def fracao_a_prazo(resumo, cfops_avista, politica=POLITICA_PARCIAL):
+    """
+    Parte do documento que recebe duplicatas, pelo resumo dos CFOPs
+    (resumir_cfops): 0 se todos os CFOPs são à vista, 1 se nenhum é (ou se
+    o documento não tem C190). Num documento misto depende da política:
+    "integral" gera as parcelas inteiras, "nenhuma" não gera e
+    "proporcional" usa a fração do VL_OPR dos CFOPs a prazo.
+    """
+    if not resumo:
+        return 1
+    a_prazo = [valor for cfop, valor in resumo.items() if cfop not in cfops_avista]
+    if not a_prazo:
+        return 0
+    if len(a_prazo) == len(resumo) or politica == "integral":
+        return 1
+    if politica == "nenhuma":
+        return 0
+    total = sum(resumo.values())
+    return Fraction(sum(a_prazo), total) if total > 0 else 1
+
+
+def _parcelas_proporcionais(duplicatas, fracao):
+    """
+    Reduz cada parcela à `fracao` do documento que é a prazo; a diferença
+    de arredondamento fica na última, para o total bater.
+    """
+    alvo = round(sum(d.centavos for d in duplicatas) * fracao)
+    novos = [int(d.centavos * fracao) for d in duplicatas]
+    novos[-1] += alvo - sum(novos)
+    return [d._replace(centavos=v) for d, v in zip(duplicatas, novos)]
+
+
+def gerar_c140_c141(campos, fracao, notas_xml):
+    """
+    Monta as linhas C140/C141 de um C100 de entrada (campos já separados).
+    `fracao` é a parte a prazo do documento (fracao_a_prazo): 0 não gera
+    nada e uma fração reduz as parcelas na mesma proporção.
+    Retorna lista vazia quando o documento não deve receber duplicatas.
+    """
+    mod = campos[5].strip()
+    chave_atual = campos[9].strip()
+    logger.debug("🔍 Encontrado C100 com chave %s, modelo %s", chave_atual, mod)
+
+    # Apenas NFe (55) e NFCe (65) aceitam duplicatas
+    if mod not in ["55", "65", "57"] or not fracao:
+        logger.debug("⚠️ Modelo %s ou CFOPs à vista. Ignorando C140/C141.", mod)
+        return []
+
+    if chave_atual not in notas_xml:
+        logger.debug("⚠️ Chave %s não encontrada entre os %d XMLs carregados.", chave_atual, len(notas_xml))
+        return []
+
+    nota = notas_xml[chave_atual]
+    duplicatas = nota.duplicatas
+
+    # Se não houver duplicatas, cria fictícia
+    if not duplicatas:
+        try:
+            duplicatas = [duplicata_ficticia(nota.emissao, campos[12] if len(campos) > 12 else "")]
+        except ValueError as e:
+            logger.warning("⚠️ C100 %s sem duplicatas no XML e sem parcela única possível (%s). "
+                           "Ignorando C140/C141.", chave_atual, e)
+            return []
+
+    if fracao != 1:
+        duplicatas = _parcelas_proporcionais(duplicatas, fracao)
+        logger.debug("➗ Documento misto: parcelas reduzidas a %s do valor.", fracao)
+
+    qtd_parc = len(duplicatas)
+    vl_total_str = formatar_centavos(sum(d.centavos for d in duplicatas))
+
+    # ---------------- C140 ----------------
+    ind_emit = "1"  # emissão própria
+    ind_tit = "00"  # duplicata
+    desc_tit = ""   # só usado se ind_tit=99
+    num_tit  = duplicatas[0].numero
+
+    c140 = f"|C140|{ind_emit}|{ind_tit}|{desc_tit}|{num_tit}|{qtd_parc}|{vl_total_str}|\n"
+    novas_linhas = [c140]
+    logger.debug("➕ Adicionado C140: %s", c140.strip())
+
+    # ---------------- C141 ----------------
+    for dup in duplicatas:
+        c141 = f"|C141|{dup.numero}|{dup.vencimento}|{formatar_centavos(dup.centavos)}|\n"
+        novas_linhas.append(c141)
+        logger.debug("➕ Adicionado C141: %s", c141.strip())
+
+    return novas_linhas
+
+
+# O que fazer com C140/C141 que já vêm no SPED de entrada
+MODOS_EXISTENTES = ("manter", "substituir")
+MODO_EXISTENTES = "manter"
+
+
+def processar_documento(linhas, notas_xml, cfops_avista, politica=POLITICA_PARCIAL,
+                        existentes=MODO_EXISTENTES, tem_c14x=True, relatorio=None):
+    """
+    Aplica as regras (regras.REGRAS) num C100 e seus filhos e insere os
+    C140/C141 logo depois do C100. `linhas` vem sem o fim de linha e é
+    alterada no lugar; devolve (campos do C100, resumo dos CFOPs dos C190,
+    fração a prazo, registros C140/C141 gerados, contagem de linhas
+    alteradas por registro, qtd de C140/C141 que já existiam).
+
+    Se o documento já tem C140/C141 (ex.: um SPED já processado), com
+    existentes="manter" eles ficam como estão e nada é gerado (resumo e
+    fração voltam None); com "substituir" são trocados pelos gerados.
+    `tem_c14x=False` avisa que o documento certamente não tem nenhum.
+
+    Com `relatorio` (relatorio.Relatorio), o tempo das regras entra em
+    "sped.zeramento" e o da geração dos C140/C141 em "sped.c140".
+    """
+    # Sem relatório, nem o contexto da etapa é criado: isto roda uma vez por C100
+    if relatorio is None:
+        tabelas, zerados = _zerar_documento(linhas)
+    else:
+        with relatorio.etapa("sped.zeramento") as medida:
+            tabelas, zerados = _zerar_documento(linhas)
+            medida["itens"] += sum(zerados.values())
+
+    # O C100 é sempre a primeira linha do documento
+    campos = tabelas["C100"][1][0] if "C100" in tabelas else linhas[0].strip().split("|")
+    resumo, fracao, registros = None, None, []
+    qtd_existentes = 0
+    if tem_c14x:
+        qtd_existentes = sum(1 for linha in linhas if _registro(linha) in ("C140", "C141"))
+    if len(campos) > 9 and campos[2] == "0":
+        if qtd_existentes and existentes == "manter":
+            logger.debug("⏭️ C100 %s já tem C140/C141; mantidos.", campos[9].strip())
+            return campos, resumo, fracao, registros, zerados, qtd_existentes
+        if qtd_existentes:
+            linhas[:] = [linha for linha in linhas if _registro(linha) not in ("C140", "C141")]
+            logger.debug("♻️ C100 %s: %d C140/C141 existentes substituídos.", campos[9].strip(), qtd_existentes)
+
+        if "C190" in tabelas:
+            c190 = tabelas["C190"][1]
+        else:
+            c190 = [linha.split("|") for linha in linhas if _registro(linha) == "C190"]
+        if relatorio is None:
+            resumo, fracao, registros = _inserir_c140_c141(linhas, campos, c190, notas_xml, cfops_avista, politica)
+        else:
+            with relatorio.etapa("sped.c140") as medida:
+                resumo, fracao, registros = _inserir_c140_c141(linhas, campos, c190, notas_xml, cfops_avista,
+                                                               politica)
+                medida["itens"] += len(registros)
+    return campos, resumo, fracao, registros, zerados, qtd_existentes
+
+
+def _zerar_documento(linhas):
+    """Aplica as regras nas linhas do documento; devolve (tabelas, linhas alteradas por registro)."""
+    tabelas = separar_documento(linhas)
+    zerados = {}
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for registro, (posicoes, tabela) in tabelas.items():
+        REGRAS_COMPILADAS[registro](tabela)
+        zerados[registro] = len(tabela)
+        for i, campos in zip(posicoes, tabela):
+            linhas[i] = "|".join(campos) + "|"
+            if debug:
+                logger.debug("%s zerado com sucesso: %s", registro, linhas[i])
+    return tabelas, zerados
+
+
+def _inserir_c140_c141(linhas, campos, c190, notas_xml, cfops_avista, politica):
+    """Gera os C140/C141 do documento logo depois do C100; devolve (resumo, fração, registros)."""
+    resumo = resumir_cfops(c190)
+    fracao = fracao_a_prazo(resumo, cfops_avista, politica)
+    registros = gerar_c140_c141(campos, fracao, notas_xml)
+    linhas[1:1] = [r.rstrip("\n") for r in registros]
+    return resumo, fracao, registros
+
+
+# CHV_NFE (campo 9) de uma linha C100
+_CHAVE_C100 = re.compile(rb"^\|C100\|(?:[^|\r\n]*\|){7}([^|\r\n]*)\|", re.M)
+
+
+def chaves_do_sped(arquivo_sped):
+    """
+    Chaves (CHV_NFE) de todos os C100 do SPED, numa varredura em bytes sem
+    separar campos. Serve para ler_xml_notas(chaves=...) parsear só os XMLs
+    que o SPED usa.
+    """
+    chaves = set()
+    with open(arquivo_sped, "rb") as f:
+        for janela in ler_janelas(f):
+            chaves.update(m.decode("latin1").strip() for m in _CHAVE_C100.findall(janela))
+    chaves.discard("")
+    return chaves
+
+
+def processar_sped(arquivo_sped, notas_xml, saida_sped, cfops_avista=(), grupos=None, progresso=None,
+                   politica=POLITICA_PARCIAL, existentes=MODO_EXISTENTES, relatorio=None, canceladas=()):
+    """
+    Lê o SPED, insere registros C140/C141, ajusta C990, 9900 e |9999|.
+    Grava num temporário que só substitui `saida_sped` no fim: num erro ou
+    cancelamento, a saída anterior fica intacta.
+    `grupos` recebe [linha na saída, chave, resumo dos CFOPs, qtd de
+    C140/C141] de cada C100 gerado, para o modo incremental.
+    """
+    validar_opcao("parcial", politica, POLITICAS_PARCIAL)
+    validar_opcao("existentes", existentes, MODOS_EXISTENTES)
+    cfops_avista = compilar_cfops(cfops_avista)
+    logger.info("📑 Lendo SPED: %s", arquivo_sped)
+
+    contagem = Counter()
+    count_c140, count_c141 = 0, 0
+    zerados = Counter()
+    mistos = 0
+    docs_existentes = 0
+    docs_cancelados = 0
+    bloco_c_aberto = False
+    c990_gravado = False
+    total_linhas = 0
+    tamanho = os.path.getsize(arquivo_sped)
+    linhas_lidas = 0
+    proximo_aviso = INTERVALO_LINHAS
+    interesse = compilar_interesse(set(REGRAS_COMPILADAS) | {"C100"})
+    # A saída só substitui o arquivo no fim: a anterior (ou a própria
+    # entrada, se for o mesmo caminho) fica intacta até lá
+    temporario = saida_sped + ".tmp"
+
+    try:
+        with open(arquivo_sped, "rb") as entrada, open(temporario, "wb") as saida, \
+                etapa(relatorio, "sped") as medida_sped:
+            fim_linha = None
+            deslocamento = 0
+            fim_do_arquivo = False
+            for conteudo in ler_janelas(entrada):
+                if fim_linha is None:
+                    fim_linha = detectar_fim_linha(conteudo)
+                pos = 0
+                while True:
+                    m = interesse.search(conteudo, pos)
+                    inicio = m.start() if m else len(conteudo)
+
+                    # ---------------- Linhas sem alteração ----------------
+                    if pos < inicio:
+                        with etapa(relatorio, "sped.varredura") as medida:
+                            for qtd, pos in copiar_trecho(conteudo, pos, inicio, saida, contagem):
+                                linhas_lidas += qtd
+                                total_linhas += qtd
+                                if progresso is not None and linhas_lidas >= proximo_aviso:
+                                    proximo_aviso = linhas_lidas + INTERVALO_LINHAS
+                                    progresso("sped", deslocamento + pos, tamanho,
+                                              {"linhas": linhas_lidas, "c140": count_c140, "c141": count_c141})
+                                medida["itens"] += qtd
+                    if m is None:
+                        break
+
+                    registro = conteudo[inicio + 1:inicio + 5].decode("latin1")
+                    if registro == "9001":
+                        fim_do_arquivo = True  # o Bloco 9 é todo regenerado
+                        break
+
+                    if registro == "C100":
+                        # ---------------- Documentos (C100 + filhos) ----------------
+                        # Os C100 seguidos (o normal no bloco C) são medidos de uma vez
+                        with etapa(relatorio, "sped.documentos") as medida:
+                            while True:
+                                pos = fim_do_documento(conteudo, fim_da_linha(conteudo, inicio))
+                                linhas = conteudo[inicio:pos].decode("latin1").split(fim_linha)
+                                final = linhas.pop() if linhas[-1] == "" else None
+                                linhas_lidas += len(linhas)
+                                tem_c14x = conteudo.find(b"\n|C14", inicio, pos) >= 0
+                                campos, resumo, fracao, registros, alterados, qtd_existentes = processar_documento(
+                                    linhas, notas_xml, cfops_avista, politica, existentes, tem_c14x, relatorio
+                                )
+                                for registro, qtd in alterados.items():
+                                    zerados[registro] += qtd
+                                if qtd_existentes:
+                                    docs_existentes += 1
+                                if canceladas and len(campos) > 9 and campos[9].strip() in canceladas:
+                                    docs_cancelados += 1
+                                    logger.debug("🚫 C100 %s: nota cancelada, sem C140/C141.", campos[9].strip())
+                                if resumo is not None:
+                                    if grupos is not None:
+                                        grupos.append([total_linhas, campos[9].strip(), resumo, len(registros)])
+                                    if 0 < sum(cfop in cfops_avista for cfop in resumo) < len(resumo):
+                                        mistos += 1
+                                    if registros:
+                                        count_c140 += 1
+                                        count_c141 += len(registros) - 1
+                                bloco_c_aberto = True
+                                for linha in linhas:
+                                    contagem[linha[1:5]] += 1
+                                total_linhas += len(linhas)
+                                if final is not None:
+                                    linhas.append(final)
+                                saida.write(fim_linha.join(linhas).encode("latin1"))
+                                medida["itens"] += 1
+                                if progresso is not None and linhas_lidas >= proximo_aviso:
+                                    proximo_aviso = linhas_lidas + INTERVALO_LINHAS
+                                    progresso("sped", deslocamento + pos, tamanho,
+                                              {"linhas": linhas_lidas, "c140": count_c140, "c141": count_c141})
+                                if not conteudo.startswith(b"|C100|", pos):
+                                    break
+                                inicio = pos
+                    else:
+                        with etapa(relatorio, "sped.varredura") as medida:
+                            pos = fim_da_linha(conteudo, inicio)
+                            linha = conteudo[inicio:pos].decode("latin1")
+                            linhas_lidas += 1
+                            if registro[:1] == "C":
+                                bloco_c_aberto = True
+                            if registro == "C990":
+                                # ---------------- Recalcular C990 ----------------
+                                c990_gravado = True
+                                texto = linha_encerramento(registro, contagem)
+                            elif registro[1:] == "990":
+                                if bloco_c_aberto and not c990_gravado:
+                                    saida.write(_em_bytes(linha_encerramento("C990", contagem), fim_linha))
+                                    contagem["C990"] += 1
+                                    c990_gravado = True
+                                    total_linhas += 1
+                                texto = linha_encerramento(registro, contagem)
+                            else:
+                                texto = limpar_icms_c100_e_c190(linha)
+                                zerados[registro] += 1
+                            dados = _em_bytes(texto, fim_linha)
+                            saida.write(dados)
+                            total_linhas += contar_registros(dados, contagem)
+                            medida["itens"] += 1
+                if fim_do_arquivo:
+                    break
+                deslocamento += len(conteudo)
+            if fim_linha is None:
+                fim_linha = "\n"
+
+            if not c990_gravado:
+                saida.write(_em_bytes(linha_encerramento("C990", contagem), fim_linha))
+                contagem["C990"] += 1
+
+            # ---------------- Gerar bloco 9 ----------------
+            with etapa(relatorio, "sped.bloco9") as medida:
+                total_linhas = gravar_bloco9(saida, contagem, fim_linha)
+                medida["itens"] += total_linhas - sum(contagem.values())
+            medida_sped["itens"] += total_linhas
+            medida_sped["bytes_lidos"] += tamanho
+            medida_sped["bytes_gravados"] += saida.tell()
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+    os.replace(temporario, saida_sped)
+
+    if progresso is not None:
+        progresso("sped", tamanho, tamanho, {"linhas": linhas_lidas, "c140": count_c140, "c141": count_c141})
+
+    logger.info(
+        "✅ SPED corrigido gerado em: %s (%d linhas; %d C100 e %d C190 zerados; %d C140 e %d C141 inseridos)",
+        saida_sped, total_linhas, zerados["C100"], zerados["C190"], count_c140, count_c141,
+    )
+    if docs_existentes:
+        logger.info("♻️ %d documentos já tinham C140/C141 (%s).", docs_existentes,
+                    "mantidos" if existentes == "manter" else "substituídos")
+    if mistos:
+        logger.info("🔀 %d documentos com CFOPs à vista e a prazo (política: %s).", mistos, politica)
+    if docs_cancelados:
+        logger.warning("🚫 %d C100 de notas canceladas ficaram sem C140/C141; confira o COD_SIT deles.",
+                       docs_cancelados)
+
+
+def _em_bytes(texto, fim_linha):
+    if fim_linha != "\n":
+        texto = texto.replace("\n", fim_linha)
+    return texto.encode("latin1")
+
+
+def gravar_bloco9(saida, contagem, fim_linha=None):
+    """
+    Grava o Bloco 9 gerado pela contagem e devolve o total de linhas do
+    arquivo. Com `fim_linha`, a saída é binária e recebe esse fim de linha.
+    """
+    bloco9 = gerar_bloco9(contagem)
+    if fim_linha is None:
+        saida.writelines(bloco9)
+    else:
+        saida.write(_em_bytes("".join(bloco9), fim_linha))
+    return sum(contagem.values()) + len(bloco9)
+
+
+def linha_encerramento(registro, contagem):
+    """
+    Linha de encerramento de bloco (0990, C990, D990...) com a quantidade
+    de linhas do bloco tiradas da contagem, incluindo o próprio X990.
+    """
+    bloco = registro[0]
+    qtd = sum(q for r, q in contagem.items() if r[:1] == bloco) + 1
+    linha = f"|{registro}|{qtd}|\n"
+    logger.debug("♻️ Recalculado %s: %s", registro, linha.strip())
+    return linha
+
+
+def gerar_bloco9(contagem):
+    """
+    Monta o Bloco 9 inteiro a partir da contagem dos registros já gravados
+    (registro -> quantidade): um 9900 por registro, na ordem em que
+    apareceram, mais os do próprio Bloco 9, o 9990 e o 9999. O custo é
+    proporcional à quantidade de tipos de registro, não de linhas.
+    """
+    registros = [r for r in contagem if len(r) == 4]
+    count_9900 = len(registros) + 4  # + 9001, 9900, 9990 e 9999
+    count_lin9 = count_9900 + 3      # + 9001, 9990 e 9999
+    total_linhas = sum(contagem.values()) + count_lin9
+
+    bloco9 = ["|9001|0|\n"]
+    bloco9.extend(f"|9900|{r}|{contagem[r]}|\n" for r in registros)
+    bloco9.append("|9900|9001|1|\n")
+    bloco9.append(f"|9900|9900|{count_9900}|\n")
+    bloco9.append("|9900|9990|1|\n")
+    bloco9.append("|9900|9999|1|\n")
+    bloco9.append(f"|9990|{count_lin9}|\n")
+    bloco9.append(f"|9999|{total_linhas}|\n")
+
+    logger.debug("♻️ Bloco 9 gerado: %d registros 9900, %d linhas no arquivo", count_9900, total_linhas)
+    return bloco9
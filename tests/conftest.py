@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Os módulos ficam na raiz do repositório e os geradores de dados em benchmarks/
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
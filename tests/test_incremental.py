@@ -0,0 +1,103 @@
+"""
+O modo incremental tem de gerar exatamente o mesmo arquivo que o
+processamento completo, e reprocessar uma saída não pode mudar nada.
+"""
+import glob
+import os
+import shutil
+
+import pytest
+
+from geradores import CFOPS_AVISTA, gerar_sped, gerar_xmls
+from incremental import processar_sped_incremental
+from sped import MODOS_EXISTENTES, POLITICAS_PARCIAL, processar_sped
+from xml_notas import ler_xml_notas
+
+
+@pytest.fixture(scope="module")
+def entradas(tmp_path_factory):
+    pasta = tmp_path_factory.mktemp("entradas")
+    sped = str(pasta / "sped.txt")
+    _, qtd_c100 = gerar_sped(sped, 1500, c170_por_c100=2, c190_por_c100=1.5, fracao_avista=0.3)
+    gerar_xmls(str(pasta / "xml"), qtd_c100, fracao_sem_dup=0.2)
+    return sped, str(pasta / "xml")
+
+
+def _ler(caminho):
+    with open(caminho, "rb") as f:
+        return f.read()
+
+
+def _comparar(sped, pasta_xml, pasta, cfops_avista, **opcoes):
+    """Roda incremental (sobre a saída anterior) e completo; devolve os dois resultados."""
+    notas = ler_xml_notas(pasta_xml, usar_cache=False)
+    processar_sped_incremental(sped, notas, str(pasta / "incremental.txt"), cfops_avista, **opcoes)
+    processar_sped(sped, notas, str(pasta / "completo.txt"), cfops_avista, **opcoes)
+    return _ler(pasta / "incremental.txt"), _ler(pasta / "completo.txt")
+
+
+def test_incremental_igual_ao_completo_ao_mudar_cfops(entradas, tmp_path):
+    sped, pasta_xml = entradas
+    for cfops_avista in (CFOPS_AVISTA, ["5102"], [], CFOPS_AVISTA + ("5102", "5405"), CFOPS_AVISTA):
+        incremental, completo = _comparar(sped, pasta_xml, tmp_path, cfops_avista)
+        assert incremental == completo, cfops_avista
+
+
+@pytest.mark.parametrize("politica", POLITICAS_PARCIAL)
+def test_incremental_igual_ao_completo_ao_mudar_politica(entradas, tmp_path, politica):
+    sped, pasta_xml = entradas
+    _comparar(sped, pasta_xml, tmp_path, CFOPS_AVISTA)
+    incremental, completo = _comparar(sped, pasta_xml, tmp_path, CFOPS_AVISTA, politica=politica)
+    assert incremental == completo
+
+
+def test_incremental_igual_ao_completo_ao_mudar_xmls(entradas, tmp_path):
+    sped, pasta_original = entradas
+    pasta_xml = str(tmp_path / "xml")
+    shutil.copytree(pasta_original, pasta_xml)
+    primeira, completo = _comparar(sped, pasta_xml, tmp_path, CFOPS_AVISTA)
+    assert primeira == completo
+
+    # Notas que somem, uma com parcela corrigida e uma que ganha duplicatas
+    arquivos = sorted(glob.glob(os.path.join(pasta_xml, "*.xml")))
+    for caminho in arquivos[:10]:
+        os.remove(caminho)
+    com_dup = next(c for c in arquivos[10:] if "<vDup>" in open(c, encoding="utf-8").read())
+    sem_dup = next(c for c in arquivos[10:] if "<cobr>" not in open(c, encoding="utf-8").read())
+    with open(com_dup, encoding="utf-8") as f:
+        conteudo = f.read().replace("<vDup>333.33</vDup>", "<vDup>500.00</vDup>", 1)
+    with open(com_dup, "w", encoding="utf-8") as f:
+        f.write(conteudo)
+    with open(sem_dup, encoding="utf-8") as f:
+        conteudo = f.read().replace(
+            "<transp/>", "<transp/><cobr><dup><nDup>001</nDup><dVenc>2025-02-10</dVenc>"
+                         "<vDup>1000.00</vDup></dup></cobr>", 1)
+    with open(sem_dup, "w", encoding="utf-8") as f:
+        f.write(conteudo)
+
+    incremental, completo = _comparar(sped, pasta_xml, tmp_path, CFOPS_AVISTA)
+    assert incremental != primeira
+    assert incremental == completo
+
+    # De volta aos XMLs originais, a saída volta a ser a primeira
+    incremental, completo = _comparar(sped, pasta_original, tmp_path, CFOPS_AVISTA)
+    assert incremental == completo == primeira
+
+
+def test_incremental_sem_mudancas_repete_a_saida(entradas, tmp_path):
+    sped, pasta_xml = entradas
+    primeira, _ = _comparar(sped, pasta_xml, tmp_path, CFOPS_AVISTA)
+    segunda, _ = _comparar(sped, pasta_xml, tmp_path, CFOPS_AVISTA)
+    assert segunda == primeira
+
+
+@pytest.mark.parametrize("existentes", MODOS_EXISTENTES)
+def test_reprocessar_saida_nao_muda_nada(entradas, tmp_path, existentes):
+    sped, pasta_xml = entradas
+    notas = ler_xml_notas(pasta_xml, usar_cache=False)
+    primeira = str(tmp_path / "primeira.txt")
+    segunda = str(tmp_path / "segunda.txt")
+    processar_sped(sped, notas, primeira, CFOPS_AVISTA, existentes=existentes)
+    processar_sped(primeira, notas, segunda, CFOPS_AVISTA, existentes=existentes)
+    assert _ler(segunda) == _ler(primeira)
+    assert b"|C140|" in _ler(primeira)
@@ -0,0 +1,37 @@
+"""Manifesto do lote: trabalhos incompletos e arquivos de CFOPs."""
+import json
+
+from cfops import CFOPS_PADRAO
+from lote import carregar_manifesto, executar_trabalho
+
+
+def _manifesto(pasta, trabalhos):
+    caminho = pasta / "manifesto.json"
+    caminho.write_text(json.dumps(trabalhos), encoding="utf-8")
+    return carregar_manifesto(str(caminho))
+
+
+def test_trabalho_incompleto_sai_com_erro(tmp_path):
+    trabalhos = _manifesto(tmp_path, [{"nome": "sem saída", "pasta_xml": "xml", "sped": "sped.txt"}, "lixo"])
+    resultados = [executar_trabalho(t) for t in trabalhos]
+    assert [r["status"] for r in resultados] == ["erro", "erro"]
+    assert "saida" in resultados[0]["erro"]
+    assert resultados[1]["nome"] == "#2"
+
+
+def test_arquivo_de_cfops_inexistente_sai_com_erro(tmp_path):
+    (trabalho,) = _manifesto(tmp_path, [{"pasta_xml": "xml", "sped": "sped.txt", "saida": "saida.txt",
+                                         "cfops": "nao_existe.json"}])
+    resultado = executar_trabalho(trabalho)
+    assert resultado["status"] == "erro"
+    assert "FileNotFoundError" in resultado["erro"]
+
+
+def test_cfops_padrao_vem_da_pasta_do_manifesto(tmp_path):
+    trabalho = {"pasta_xml": "xml", "sped": "sped.txt", "saida": "saida.txt"}
+    (sem_arquivo,) = _manifesto(tmp_path, [trabalho])
+    assert sem_arquivo["cfops"] == list(CFOPS_PADRAO)
+
+    (tmp_path / "cfops_avista.json").write_text('["5910"]', encoding="utf-8")
+    (com_arquivo,) = _manifesto(tmp_path, [trabalho])
+    assert com_arquivo["cfops"] == str(tmp_path / "cfops_avista.json")
@@ -0,0 +1,39 @@
+"""processar_sped com notas e C100 incompletos."""
+from datetime import date
+
+from geradores import chave_nfe, gerar_sped
+from notas import Nota
+from sped import processar_sped
+
+
+def _c14x_por_chave(caminho):
+    """Chave de cada C100 -> registros C140/C141 logo abaixo dele."""
+    grupos = {}
+    with open(caminho, encoding="latin1") as f:
+        for linha in f:
+            campos = linha.split("|")
+            if campos[1] == "C100":
+                atual = grupos.setdefault(campos[9], [])
+            elif campos[1] in ("C140", "C141"):
+                atual.append(campos[1])
+    return grupos
+
+
+def test_nota_sem_emissao_ou_c100_sem_valor_nao_derruba_o_sped(tmp_path):
+    entrada = tmp_path / "sped.txt"
+    gerar_sped(str(entrada), 60, fracao_outros=0, fracao_avista=0, fracao_entrada=0)
+    texto = entrada.read_text(encoding="latin1").replace(f"|{chave_nfe(1)}|01012025|01012025|1000,00|",
+                                                          f"|{chave_nfe(1)}|01012025|01012025||")
+    entrada.write_text(texto, encoding="latin1")
+    notas = {
+        chave_nfe(0): Nota("0", None, ()),            # sem dhEmi/dEmi e sem cobr/dup
+        chave_nfe(1): Nota("1", date(2025, 1, 1), ()),  # C100 sem VL_DOC
+        chave_nfe(2): Nota("2", date(2025, 1, 1), ()),
+    }
+    saida = tmp_path / "saida.txt"
+    processar_sped(str(entrada), notas, str(saida), ())
+
+    grupos = _c14x_por_chave(saida)
+    assert grupos[chave_nfe(0)] == []
+    assert grupos[chave_nfe(1)] == []
+    assert grupos[chave_nfe(2)] == ["C140", "C141"]
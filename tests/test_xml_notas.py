@@ -0,0 +1,108 @@
+"""ler_xml_notas: pastas com .zip, cópias da mesma nota e cancelamentos."""
+import zipfile
+
+from geradores import _cte, chave_nfe, xml_nfe
+from xml_notas import ler_xml_notas
+
+
+def _gravar(caminho, texto):
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write(texto)
+
+
+def test_zip_e_xml_com_extensao_maiuscula(tmp_path):
+    interno = tmp_path / "INTERNO.ZIP"
+    with zipfile.ZipFile(interno, "w") as z:
+        z.writestr(f"{chave_nfe(2)}-procNFe.XML", xml_nfe(chave_nfe(2), 2, 3, 1))
+    with zipfile.ZipFile(tmp_path / "OUTER.ZIP", "w") as z:
+        z.writestr(f"{chave_nfe(1)}-procNFe.XML", xml_nfe(chave_nfe(1), 1, 3, 1))
+        z.write(interno, "INTERNO.ZIP")
+    interno.unlink()
+    _gravar(tmp_path / f"{chave_nfe(3)}-procNFe.Xml", xml_nfe(chave_nfe(3), 3, 2, 1))
+
+    notas = ler_xml_notas(str(tmp_path), usar_cache=False)
+    assert sorted(notas) == [chave_nfe(1), chave_nfe(2), chave_nfe(3)]
+    assert len(notas[chave_nfe(2)].duplicatas) == 3
+    assert ler_xml_notas(str(tmp_path / "OUTER.ZIP"), usar_cache=False).keys() == {chave_nfe(1), chave_nfe(2)}
+
+
+def _nfe_sem_protocolo(chave, numero, dups):
+    """A mesma NF-e de xml_nfe, sem o nfeProc/protNFe em volta."""
+    texto = xml_nfe(chave, numero, dups, 1)
+    inicio = texto.index("<NFe>")
+    fim = texto.index("</NFe>") + len("</NFe>")
+    return '<?xml version="1.0" encoding="UTF-8"?>' + texto[inicio:fim].replace(
+        "<NFe>", '<NFe xmlns="http://www.portalfiscal.inf.br/nfe">', 1)
+
+
+def _evento_cancelamento(chave):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<procEventoNFe xmlns="http://www.portalfiscal.inf.br/nfe" versao="1.00"><evento><infEvento>'
+        f"<chNFe>{chave}</chNFe><tpEvento>110111</tpEvento></infEvento></evento>"
+        f"<retEvento><infEvento><cStat>135</cStat><chNFe>{chave}</chNFe></infEvento></retEvento>"
+        "</procEventoNFe>"
+    )
+
+
+def _ler_tres_vezes(pasta):
+    """(notas, duplicados) sem cache, com o cache vazio e com o cache cheio."""
+    leituras = []
+    for usar_cache in (False, True, True):
+        duplicados = []
+        notas = ler_xml_notas(str(pasta), usar_cache=usar_cache, duplicados=duplicados)
+        leituras.append(({chave: len(nota.duplicatas) for chave, nota in notas.items()}, sorted(duplicados)))
+    return leituras
+
+
+def test_cte_nao_substitui_a_nfe_com_ou_sem_cache(tmp_path):
+    _gravar(tmp_path / "a.xml", xml_nfe(chave_nfe(1), 1, 3, 1))
+    _gravar(tmp_path / "b.xml", _cte(chave_nfe(1, "57"), chave_nfe(1)))
+
+    leituras = _ler_tres_vezes(tmp_path)
+    assert leituras[0] == ({chave_nfe(1): 3}, [("b.xml", "a.xml", "colisão")])
+    assert leituras[1] == leituras[0] and leituras[2] == leituras[0]
+
+
+def test_copias_pelo_cabecalho_ficam_com_o_nfeproc(tmp_path):
+    _gravar(tmp_path / "nota_a.xml", _nfe_sem_protocolo(chave_nfe(1), 1, 2))
+    _gravar(tmp_path / "nota_b.xml", xml_nfe(chave_nfe(1), 1, 3, 1))
+    _gravar(tmp_path / "nota_b (1).xml", xml_nfe(chave_nfe(1), 1, 3, 2))
+
+    leituras = _ler_tres_vezes(tmp_path)
+    assert leituras[0] == ({chave_nfe(1): 3}, [("nota_a.xml", "nota_b.xml", "cabeçalho"),
+                                               ("nota_b (1).xml", "nota_b.xml", "cabeçalho")])
+    assert leituras[1] == leituras[0] and leituras[2] == leituras[0]
+
+
+def test_copias_identicas_sem_chave_no_nome(tmp_path):
+    for nome in ("cte.xml", "cte (1).xml"):
+        _gravar(tmp_path / nome, _cte(chave_nfe(1, "57"), chave_nfe(1)))
+    _gravar(tmp_path / "nota.xml", xml_nfe(chave_nfe(1), 1, 3, 1))
+
+    leituras = _ler_tres_vezes(tmp_path)
+    assert leituras[0] == ({chave_nfe(1): 3}, [("cte (1).xml", "cte.xml", "conteúdo"),
+                                               ("cte.xml", "nota.xml", "colisão")])
+    assert leituras[1] == leituras[0] and leituras[2] == leituras[0]
+
+
+def test_xml_mantido_que_nao_abre_usa_a_copia(tmp_path):
+    chave = chave_nfe(1)
+    _gravar(tmp_path / f"{chave}-procNFe.xml", xml_nfe(chave, 1, 3, 1)[:60] + "\x00 truncado")
+    _gravar(tmp_path / f"{chave}-nfe.xml", _nfe_sem_protocolo(chave, 1, 2))
+
+    duplicados = []
+    notas = ler_xml_notas(str(tmp_path), usar_cache=False, duplicados=duplicados)
+    assert len(notas[chave].duplicatas) == 2
+    assert duplicados == []
+
+
+def test_nota_cancelada_fica_de_fora(tmp_path):
+    _gravar(tmp_path / f"{chave_nfe(1)}-procNFe.xml", xml_nfe(chave_nfe(1), 1, 3, 1))
+    _gravar(tmp_path / f"{chave_nfe(2)}-procNFe.xml", xml_nfe(chave_nfe(2), 2, 3, 1))
+    _gravar(tmp_path / "cancelamento.xml", _evento_cancelamento(chave_nfe(1)))
+
+    canceladas = set()
+    notas = ler_xml_notas(str(tmp_path), usar_cache=False, canceladas=canceladas)
+    assert list(notas) == [chave_nfe(2)]
+    assert canceladas == {chave_nfe(1)}
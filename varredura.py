@@ -0,0 +1,115 @@
+import re
+from collections import Counter
+
+# ---------------- VARREDURA DO SPED EM BYTES ----------------
+#
+# O SPED é lido em janelas de bytes (ler_janelas), sem decodificar: só as
+# linhas que o processamento altera (C100 e filhos, registros com regra,
+# X990 e o |9001|) viram str. O resto é copiado para a saída em trechos
+# inteiros. Só uma janela fica na memória por vez, qualquer que seja o
+# tamanho do arquivo.
+
+TAMANHO_JANELA = 4 << 20
+TAMANHO_TRECHO = 1 << 20
+
+# Uma linha por item: o código do registro (linha[1:5]) ou b"" numa
+# linha vazia
+_CODIGO = re.compile(rb"(?:.([^\r\n]{0,4}))?[^\n]*\n")
+
+
+def compilar_interesse(registros):
+    """
+    Expressão que acha o início da próxima linha que o processamento
+    precisa ler: os `registros` pedidos, qualquer X990 e o |9001|.
+    """
+    codigos = b"|".join(re.escape(r.encode("latin1")) for r in sorted(registros))
+    return re.compile(rb"^(?:.(?:" + codigos + rb")|.[^\r\n]990|\|9001\|)", re.M)
+
+
+# Início da primeira linha, a partir da posição, que não é filho de C100
+# (C101..C199)
+_FIM_DOCUMENTO = re.compile(rb"^(?!.C1(?!00))", re.M)
+
+
+def ler_janelas(arquivo, tamanho=TAMANHO_JANELA):
+    """
+    Lê o arquivo aberto em binário em janelas de cerca de `tamanho` bytes,
+    cortadas no início de uma linha que não é filha de C100: um documento
+    (C100 e filhos) nunca fica dividido entre duas janelas. O que passa do
+    corte vai para o começo da próxima janela.
+    """
+    resto = b""
+    while True:
+        bloco = arquivo.read(tamanho)
+        if not bloco:
+            if resto:
+                yield resto
+            return
+        janela = resto + bloco
+        corte = _ultimo_corte(janela)
+        if corte:
+            yield janela[:corte]
+            resto = janela[corte:]
+        else:
+            resto = janela  # documento maior que a janela: lê mais
+
+
+def _ultimo_corte(janela):
+    """Início da última linha da janela em que um documento pode começar (0 se nenhuma)."""
+    fim = len(janela)
+    while True:
+        quebra = janela.rfind(b"\n", 0, fim)
+        if quebra < 0:
+            return 0
+        inicio = quebra + 1
+        # Os 5 primeiros bytes da linha decidem se ela é filha de C100
+        if inicio + 5 <= len(janela) and _FIM_DOCUMENTO.match(janela, inicio):
+            return inicio
+        fim = quebra
+
+
+def fim_do_documento(conteudo, pos):
+    m = _FIM_DOCUMENTO.search(conteudo, pos)
+    return m.start() if m else len(conteudo)
+
+
+def fim_da_linha(conteudo, inicio):
+    fim = conteudo.find(b"\n", inicio)
+    return len(conteudo) if fim < 0 else fim + 1
+
+
+def detectar_fim_linha(conteudo):
+    """'\\r\\n' ou '\\n', conforme a primeira linha do arquivo."""
+    fim = conteudo.find(b"\n")
+    return "\r\n" if fim > 0 and conteudo[fim - 1:fim] == b"\r" else "\n"
+
+
+def contar_registros(trecho, contagem):
+    """
+    Soma em `contagem` (registro -> quantidade) as linhas do trecho e
+    devolve quantas são.
+    """
+    codigos = _CODIGO.findall(trecho)
+    if trecho and not trecho.endswith(b"\n"):
+        codigos.append(trecho[trecho.rfind(b"\n") + 1:][1:5])
+    for codigo, qtd in Counter(codigos).items():
+        contagem[codigo.decode("latin1")] += qtd
+    return len(codigos)
+
+
+def copiar_trecho(conteudo, inicio, fim, saida, contagem):
+    """
+    Copia conteudo[inicio:fim] para a saída em pedaços de até
+    TAMANHO_TRECHO (cortados em fim de linha), contando os registros.
+    Gera (linhas copiadas, posição) a cada pedaço.
+    """
+    while inicio < fim:
+        corte = fim
+        if fim - inicio > TAMANHO_TRECHO:
+            corte = conteudo.rfind(b"\n", inicio, inicio + TAMANHO_TRECHO) + 1
+            if corte <= inicio:
+                corte = fim_da_linha(conteudo, inicio + TAMANHO_TRECHO)
+        trecho = conteudo[inicio:corte]
+        saida.write(trecho)
+        yield contar_registros(trecho, contagem), corte
+        inicio = corte
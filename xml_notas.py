@@ -0,0 +1,681 @@
+import hashlib
+import io
+import logging
+import mmap
+import os
+import re
+import sqlite3
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from functools import partial
+
+from cache_notas import abrir_cache, carregar_cache, gravar_cache
+from compactados import ERROS_ZIP, eh_zip, fechar_zips, inicio_membro, ler_membro, listar_zip
+from formatacao import reparar_conteudo, reparar_xml
+from notas import Nota, nova_duplicata
+from progresso import mapear
+from relatorio import etapa
+
+logger = logging.getLogger(__name__)
+
+# ---------------- FUNÇÕES XML ----------------
+
+
+def _tag(elemento):
+    """Nome local da tag, sem o namespace."""
+    return elemento.tag.rpartition("}")[2]
+
+
+_INICIO_ITENS = b"<det nItem="
+_FIM_ITENS = b"</det>"
+
+
+def _cortar_itens(conteudo):
+    """
+    Conteúdo do XML (bytes ou mmap) sem o trecho <det nItem=...>...</det>
+    (os itens da NF-e, que são quase todo o arquivo e não interessam aqui).
+    Devolve None quando não há itens para cortar.
+    """
+    inicio = conteudo.find(_INICIO_ITENS)
+    if inicio < 0:
+        return None
+    fim = conteudo.rfind(_FIM_ITENS)
+    if fim < inicio:
+        return None
+    return conteudo[:inicio] + conteudo[fim + len(_FIM_ITENS):]
+
+
+def _xml_sem_itens(caminho):
+    """
+    _cortar_itens sobre um mmap do arquivo, que assim não é copiado
+    inteiro para a memória.
+    """
+    with open(caminho, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # arquivo vazio
+            return None
+        with mm:
+            return _cortar_itens(mm)
+
+
+def extrair_nota(caminho):
+    """
+    Lê um XML (NF-e ou CT-e) e devolve (chave, notas.Nota), com número,
+    data de emissão e as duplicatas já convertidas (notas.Duplicata).
+    ValueError se uma data ou duplicata for inválida.
+
+    Só chNFe / infNFe@Id / infNFe/chave, nNF, dhEmi/dEmi e cobr/dup são
+    lidos. Os <det> de uma NF-e são cortados antes do parse
+    (_xml_sem_itens) e o resto é lido em fluxo com iterparse; se o corte
+    não resultar num XML válido, o arquivo inteiro é lido em fluxo,
+    descartando cada <det> assim que termina.
+    """
+    conteudo = _xml_sem_itens(caminho)
+    if conteudo is not None:
+        try:
+            return _extrair_campos(io.BytesIO(conteudo))
+        except ET.ParseError:
+            pass
+    return _extrair_campos(caminho)
+
+
+def extrair_nota_de_bytes(dados):
+    """extrair_nota sobre o conteúdo já lido (ex.: um membro de .zip)."""
+    conteudo = _cortar_itens(dados)
+    if conteudo is not None:
+        try:
+            return _extrair_campos(io.BytesIO(conteudo))
+        except ET.ParseError:
+            pass
+    return _extrair_campos(io.BytesIO(dados))
+
+
+def _extrair_campos(fonte):
+    """
+    Percorre o XML com iterparse. Numa NF-e a leitura para no fim do
+    infNFe, sem percorrer assinatura e protocolo: a chave vem do Id do
+    infNFe, a mesma do chNFe do protNFe.
+    """
+    ch_nfe = chave_id = chave_cte = None
+    n_nf = dh_emi = d_emi = None
+    duplicatas = []
+
+    for _, el in ET.iterparse(fonte):
+        tag = el.tag
+        tag = tag[tag.rfind("}") + 1:]
+
+        if tag == "det":
+            el.clear()
+        elif tag == "nNF":
+            if n_nf is None and el.text:
+                n_nf = el.text.strip()
+        elif tag == "dhEmi":
+            if dh_emi is None:
+                dh_emi = el.text
+        elif tag == "dEmi":
+            if d_emi is None:
+                d_emi = el.text
+        elif tag == "dup":
+            campos = {"nDup": None, "dVenc": None, "vDup": None}
+            for filho in el:
+                campos[_tag(filho)] = filho.text
+            duplicatas.append(nova_duplicata(campos["nDup"], campos["dVenc"], campos["vDup"]))
+        elif tag == "chNFe":
+            if ch_nfe is None and el.text:
+                ch_nfe = el.text.strip()
+        elif tag == "infNFe":
+            id_nfe = el.get("Id") or ""
+            if id_nfe.startswith("NFe"):
+                chave_id = id_nfe[3:].strip()
+                el.clear()
+                break  # assinatura e protocolo não interessam
+            # Chave da NF dentro do CT-e
+            chave_el = el.find("{*}chave")
+            if chave_cte is None and chave_el is not None and chave_el.text:
+                chave_cte = chave_el.text.strip()
+
+    # Chave da NF-e; se não houver, a da NF dentro do CT-e
+    chave = ch_nfe or chave_id or chave_cte
+
+    # Caso seja CT-e (não tem <nNF>)
+    if n_nf is None and chave and len(chave) == 44:
+        n_nf = chave[25:34].lstrip("0")
+
+    # Data de emissão
+    texto_emissao = dh_emi if dh_emi is not None else d_emi
+    data_emissao = datetime.fromisoformat(texto_emissao).date() if texto_emissao is not None else None
+
+    return chave, Nota(n_nf, data_emissao, tuple(duplicatas))
+
+
+def _listar_xmls(pasta_xml):
+    """
+    XMLs da pasta em ordem de nome (a ordem decide duplicidades), como
+    tuplas (nome, marca, tamanho, origem). Um arquivo .xml tem o mtime_ns
+    como marca e o caminho como origem; os .zip da pasta entram com os
+    seus XMLs como "arquivo.zip/membro.xml" (compactados.listar_zip, marca
+    = CRC). `pasta_xml` também pode ser um .zip, lido como se fosse a
+    pasta extraída.
+    """
+    if eh_zip(pasta_xml):
+        arquivos = listar_zip(pasta_xml)
+    else:
+        arquivos = []
+        with os.scandir(pasta_xml) as entradas:
+            for entrada in entradas:
+                if not entrada.is_file():
+                    continue
+                if entrada.name.lower().endswith(".xml"):
+                    st = entrada.stat()
+                    arquivos.append((entrada.name, st.st_mtime_ns, st.st_size, entrada.path))
+                elif entrada.name.lower().endswith(".zip"):
+                    arquivos += listar_zip(entrada.path, entrada.name + "/")
+    arquivos.sort(key=lambda arquivo: arquivo[0])
+    return arquivos
+
+
+def _extrair_origem(origem):
+    if isinstance(origem, tuple):
+        return extrair_nota_de_bytes(ler_membro(origem))
+    return extrair_nota(origem)
+
+
+# ---------------- TIPO DO DOCUMENTO ----------------
+
+# Raízes lidas como nota (CT-e entra pela NF-e que transporta) e raízes de
+# evento, das quais só o cancelamento homologado interessa
+RAIZES_NOTA = frozenset({"nfeProc", "NFe", "cteProc", "CTe"})
+RAIZES_EVENTO = frozenset({"procEventoNFe", "evento", "envEvento", "retEnvEvento"})
+EVENTOS_CANCELAMENTO = frozenset({"110111", "110112"})  # cancelamento, por substituição
+STATUS_EVENTO_HOMOLOGADO = frozenset({"135", "155"})
+
+_NOME_RAIZ = re.compile(rb"<(?:[A-Za-z_][\w.-]*:)?([A-Za-z_][\w.-]*)")
+
+
+def raiz_do_xml(inicio):
+    """
+    Nome local do elemento raiz a partir do começo do arquivo (bytes),
+    pulando declaração, comentários e DOCTYPE. None se não aparecer (ex.:
+    arquivo em UTF-16 ou começo longo demais); aí o arquivo vai ao parse.
+    """
+    pos = 0
+    while True:
+        pos = inicio.find(b"<", pos)
+        if pos < 0:
+            return None
+        if inicio.startswith(b"<?", pos):
+            fim = inicio.find(b"?>", pos)
+        elif inicio.startswith(b"<!--", pos):
+            fim = inicio.find(b"-->", pos)
+        elif inicio.startswith(b"<!", pos):
+            fim = inicio.find(b">", pos)
+        else:
+            m = _NOME_RAIZ.match(inicio, pos)
+            return m.group(1).decode("ascii") if m else None
+        if fim < 0:
+            return None
+        pos = fim + 1
+
+
+def _cancelamento(fonte):
+    """
+    Chave da NF-e cancelada por um evento (procEventoNFe etc.), ou None se
+    o evento não é de cancelamento ou não tem retorno homologado (cStat).
+    """
+    tipo = chave = None
+    homologado = False
+    for _, el in ET.iterparse(fonte):
+        tag = el.tag
+        tag = tag[tag.rfind("}") + 1:]
+        if tag == "tpEvento" and tipo is None:
+            tipo = (el.text or "").strip()
+        elif tag == "chNFe" and chave is None:
+            chave = (el.text or "").strip()
+        elif tag == "cStat" and (el.text or "").strip() in STATUS_EVENTO_HOMOLOGADO:
+            homologado = True
+    if tipo in EVENTOS_CANCELAMENTO and homologado and chave:
+        return chave
+    return None
+
+
+def ler_documento(origem, dados=None):
+    """
+    Lê um XML conforme o tipo, decidido pela raiz nos primeiros
+    TAMANHO_CABECALHO bytes (raiz_do_xml), antes de qualquer parse, e
+    devolve (chave, Nota, raiz):
+    - nota (RAIZES_NOTA) ou raiz desconhecida: chave e Nota de extrair_nota
+    - evento de cancelamento homologado: chave cancelada e None
+    - qualquer outro (resNFe, CC-e, eventos não homologados...): None e None
+    `dados` é o conteúdo já em memória (ex.: reparado); sem ele, a origem
+    (caminho ou membro de .zip) é lida.
+    """
+    if dados is not None:
+        raiz = raiz_do_xml(dados[:TAMANHO_CABECALHO])
+    else:
+        raiz = raiz_do_xml(_inicio(origem))
+    if raiz in RAIZES_EVENTO:
+        if dados is None:
+            dados = ler_membro(origem) if isinstance(origem, tuple) else None
+        return _cancelamento(io.BytesIO(dados) if dados is not None else origem), None, raiz
+    if raiz is not None and raiz not in RAIZES_NOTA:
+        return None, None, raiz
+    if dados is not None:
+        return extrair_nota_de_bytes(dados) + (raiz,)
+    return _extrair_origem(origem) + (raiz,)
+
+
+def extrair_ou_reparar(origem, reparar=True):
+    """
+    ler_documento que não derruba a leitura por um XML mal formado.
+    `origem` é o caminho do arquivo ou a tupla de um membro de .zip
+    (compactados). Devolve (resultado, situação, mensagem): situação None
+    se o XML abriu direto; "corrigido" se abriu depois do reparo
+    (formatacao; um arquivo é regravado, um membro de .zip só é reparado em
+    memória); "erro" se não abriu ou tem data/duplicata inválida
+    (resultado None), inclusive um membro de .zip danificado. Com
+    reparar=False o ParseError segue adiante, como em extrair_nota.
+    """
+    try:
+        return ler_documento(origem), None, None
+    except ValueError as e:
+        return None, "erro", str(e)
+    except ERROS_ZIP as e:
+        if not isinstance(origem, tuple):
+            raise
+        return None, "erro", str(e)
+    except ET.ParseError as e:
+        if not reparar:
+            raise
+        if isinstance(origem, tuple):
+            situacao, mensagem, corrigido = reparar_conteudo(ler_membro(origem))
+        else:
+            situacao, mensagem = reparar_xml(origem)
+            corrigido = None
+        if situacao != "corrigido":
+            return None, "erro", mensagem or str(e)
+        return ler_documento(origem, corrigido), "corrigido", str(e)
+
+
+# ---------------- ÍNDICE POR CHAVE ----------------
+
+# Modelos de documento cuja chave no nome do arquivo é a da própria nota
+# (NF-e e NFC-e); CT-e e eventos caem no exame do cabeçalho
+_MODELOS_NOTA = ("55", "65")
+_CHAVE_NO_NOME = re.compile(r"(?<!\d)(\d{44})(?!\d)")
+_CHAVE_NO_CABECALHO = re.compile(rb'<infNFe\b[^>]*\bId\s*=\s*["\']NFe(\d{44})["\']')
+TAMANHO_CABECALHO = 4096
+
+
+def _chave_do_nome(nome):
+    """Chave de NF-e/NFC-e contida no nome do arquivo, ou None."""
+    m = _CHAVE_NO_NOME.search(nome)
+    if m and m.group(1)[20:22] in _MODELOS_NOTA:
+        return m.group(1)
+    return None
+
+
+def _inicio(origem):
+    """
+    Os primeiros TAMANHO_CABECALHO bytes do arquivo ou membro de .zip (b""
+    se o membro está danificado; o erro aparece no parse).
+    """
+    if isinstance(origem, tuple):
+        try:
+            return inicio_membro(origem, TAMANHO_CABECALHO)
+        except ERROS_ZIP:
+            return b""
+    with open(origem, "rb") as f:
+        return f.read(TAMANHO_CABECALHO)
+
+
+def _chave_do_cabecalho(origem):
+    """Chave do infNFe@Id nos primeiros TAMANHO_CABECALHO bytes, ou None."""
+    m = _CHAVE_NO_CABECALHO.search(_inicio(origem))
+    return m.group(1).decode("ascii") if m else None
+
+
+def chave_provavel(nome, origem):
+    """
+    Chave da nota de um XML sem parsear: pelo nome do arquivo ou, se o nome
+    não traz uma chave de NF-e, pelo cabeçalho (origem como em
+    _listar_xmls). None quando não dá para saber sem o parse (ex.: CT-e,
+    cuja chave de NF-e fica no fim).
+    """
+    return _chave_do_nome(os.path.basename(nome)) or _chave_do_cabecalho(origem)
+
+
+# ---------------- DUPLICADOS ----------------
+#
+# A mesma NF-e costuma vir duas ou três vezes na pasta ("-nfe.xml",
+# "-procNFe.xml", downloads repetidos com " (1)"). Cada documento lógico é
+# parseado uma vez só:
+# - pela chave no nome: entre os XMLs de nota com a mesma chave vale o
+#   autorizado (nfeProc); empatando, o último em ordem de nome. Só o
+#   cabeçalho de cada um é lido (raiz_do_xml);
+# - pela chave do cabeçalho (infNFe@Id) dos que não a trazem no nome (ou
+#   pela do cache, se já foram lidos como NF-e), com a mesma preferência;
+# - pelo conteúdo, para os que não trazem a chave no nome: tamanho igual e
+#   mesmo hash (BLAKE2b) são o mesmo arquivo, parseado uma vez.
+# Se o XML mantido não abrir, vale a próxima cópia descartada que abrir.
+# Notas repetidas que só aparecem no parse (ex.: um CT-e, ou cabeçalho
+# sem a chave) são informadas como "colisão", com a mesma preferência.
+
+_PREFERENCIA_RAIZ = {"nfeProc": 2, "NFe": 1}
+
+
+def duplicados_por_chave(arquivos, cabecalho=False, conhecidas=None):
+    """
+    Dos arquivos (tuplas de _listar_xmls), os XMLs de nota repetidos pela
+    chave no nome, como nome descartado -> nome mantido, do preferido ao
+    menos preferido. Com cabecalho, os sem chave no nome entram pela chave
+    em `conhecidas` (nome -> chave) ou, na falta, pela do cabeçalho.
+    Eventos e outros documentos não entram na disputa.
+    """
+    conhecidas = conhecidas or {}
+    grupos = {}
+    for indice, arquivo in enumerate(arquivos):
+        chave = _chave_do_nome(os.path.basename(arquivo[0]))
+        if chave is None and cabecalho:
+            chave = conhecidas.get(arquivo[0]) or _chave_do_cabecalho(arquivo[3])
+        if chave is not None:
+            grupos.setdefault(chave, []).append(indice)
+
+    descartados = {}
+    for indices in grupos.values():
+        if len(indices) < 2:
+            continue
+        candidatos = []
+        for indice in indices:
+            raiz = raiz_do_xml(_inicio(arquivos[indice][3]))
+            if raiz is None or raiz in RAIZES_NOTA:
+                candidatos.append((_PREFERENCIA_RAIZ.get(raiz, 0), indice))
+        if len(candidatos) < 2:
+            continue
+        mantido = arquivos[max(candidatos)[1]][0]
+        for _, indice in sorted(candidatos, reverse=True):
+            if arquivos[indice][0] != mantido:
+                descartados[arquivos[indice][0]] = mantido
+    return descartados
+
+
+def _hash(origem):
+    """Hash do conteúdo, ou None se o membro de .zip está danificado."""
+    if isinstance(origem, tuple):
+        try:
+            dados = ler_membro(origem)
+        except ERROS_ZIP:
+            return None
+    else:
+        with open(origem, "rb") as f:
+            dados = f.read()
+    return hashlib.blake2b(dados, digest_size=16).digest()
+
+
+def duplicados_por_conteudo(arquivos):
+    """
+    Dos arquivos sem chave no nome, os de conteúdo idêntico, como nome
+    descartado -> nome mantido (o último em ordem de nome). Só os de mesmo
+    tamanho que outro são lidos para o hash.
+    """
+    por_tamanho = {}
+    for arquivo in arquivos:
+        if _chave_do_nome(os.path.basename(arquivo[0])) is None:
+            por_tamanho.setdefault(arquivo[2], []).append(arquivo)
+
+    descartados = {}
+    for mesmo_tamanho in por_tamanho.values():
+        if len(mesmo_tamanho) < 2:
+            continue
+        por_hash = {}
+        for nome, _, _, origem in mesmo_tamanho:
+            digest = _hash(origem)
+            if digest is not None:
+                por_hash.setdefault(digest, []).append(nome)
+        for nomes in por_hash.values():
+            for nome in nomes[:-1]:
+                descartados[nome] = nomes[-1]
+    return descartados
+
+
+def _reservas_da_vez(reservas, invalidos):
+    """
+    Para cada XML mantido que não abriu, a próxima cópia descartada (na
+    ordem de preferência), como nome descartado -> nome mantido.
+    """
+    escolhidas = {}
+    for nome, mantido in reservas.items():
+        if mantido in invalidos and mantido not in escolhidas.values():
+            escolhidas[nome] = mantido
+    return escolhidas
+
+
+def ler_xml_notas(pasta_xml, processos=1, usar_cache=True, progresso=None, relatorio=None, reparar=True,
+                  chaves=None, canceladas=None, duplicados=None):
+    """
+    Lê os XMLs da pasta (ou .zip) e devolve chave -> notas.Nota, usando o
+    cache de XMLs e um pool de `processos`. Com `chaves`, só parseia as
+    dessas notas; cada nota repetida é lida uma vez (ver DUPLICADOS) e
+    `duplicados` recebe (descartado, mantido, motivo). As canceladas ficam
+    de fora e vão para `canceladas`.
+    """
+    notas = {}
+    logger.info("🔎 Lendo XMLs da pasta: %s", pasta_xml)
+    with etapa(relatorio, "xml.listagem") as medida:
+        todos = _listar_xmls(pasta_xml)
+        medida["itens"] += len(todos)
+
+    with etapa(relatorio, "xml.duplicados") as medida:
+        por_chave = duplicados_por_chave(todos)
+        arquivos = [arquivo for arquivo in todos if arquivo[0] not in por_chave]
+        medida["itens"] += len(todos)
+
+    con = None
+    em_cache = {}
+    if usar_cache:
+        with etapa(relatorio, "xml.cache") as medida:
+            try:
+                con = abrir_cache(pasta_xml)
+                em_cache = carregar_cache(con)
+            except sqlite3.Error as e:
+                logger.warning("⚠️ Cache de XMLs indisponível, lendo tudo: %s", e)
+                con = None
+            medida["itens"] += len(em_cache)
+
+    resultados = {}
+    pendentes = []
+    invalidos = set()
+    do_cache = 0
+    for arquivo in arquivos:
+        registro = em_cache.get(arquivo[0])
+        if registro is not None and registro[:2] == arquivo[1:3]:
+            resultados[arquivo[0]] = registro[2:]
+            do_cache += 1
+        else:
+            pendentes.append(arquivo)
+
+    fora = 0
+    if chaves is not None:
+        with etapa(relatorio, "xml.indice") as medida:
+            medida["itens"] += len(pendentes)
+            selecionados = []
+            for arquivo in pendentes:
+                chave = chave_provavel(arquivo[0], arquivo[3])
+                if chave is None or chave in chaves:
+                    selecionados.append(arquivo)
+            fora = len(pendentes) - len(selecionados)
+            pendentes = selecionados
+
+    # Cópias da mesma chave no cabeçalho (ou no cache) ficam só com a
+    # preferida; das idênticas fora do cache parseia uma, as outras ficam
+    # com o mesmo resultado (e entram no cache com ele)
+    with etapa(relatorio, "xml.duplicados"):
+        a_ler = {arquivo[0] for arquivo in pendentes}
+        conhecidas = {nome: chave for nome, (chave, nota, raiz) in resultados.items()
+                      if nota is not None and raiz in _PREFERENCIA_RAIZ}
+        por_cabecalho = duplicados_por_chave([arquivo for arquivo in arquivos
+                                              if arquivo[0] in a_ler or arquivo[0] in resultados],
+                                             cabecalho=True, conhecidas=conhecidas)
+        pendentes = [arquivo for arquivo in pendentes if arquivo[0] not in por_cabecalho]
+        for nome in por_cabecalho:
+            if resultados.pop(nome, None) is not None:
+                do_cache -= 1
+        # Os do cache que não são NF-e (CT-e, eventos) também entram, para o
+        # motivo não mudar entre a primeira execução e as seguintes
+        por_conteudo = duplicados_por_conteudo(
+            pendentes + [arquivo for arquivo in arquivos
+                         if arquivo[0] in resultados and arquivo[0] not in conhecidas])
+        copias = [arquivo for arquivo in pendentes if arquivo[0] in por_conteudo]
+        pendentes = [arquivo for arquivo in pendentes if arquivo[0] not in por_conteudo]
+    reservas = {**por_chave, **por_cabecalho}
+    por_nome = {arquivo[0]: arquivo for arquivo in todos}
+
+    try:
+        with etapa(relatorio, "xml.parse") as medida:
+            extrair = partial(extrair_ou_reparar, reparar=reparar)
+            feitos, total = len(resultados), len(resultados) + len(pendentes)
+            rodada = pendentes
+            while rodada:
+                lidos = mapear(extrair, [arquivo[3] for arquivo in rodada], processos)
+                for i, (resultado, situacao, mensagem) in enumerate(lidos):
+                    nome, _, tamanho, origem = rodada[i]
+                    if situacao == "corrigido":
+                        logger.info("🛠 XML mal formado corrigido: %s (%s)", nome, mensagem)
+                        if not isinstance(origem, tuple):
+                            st = os.stat(origem)
+                            rodada[i] = (nome, st.st_mtime_ns, st.st_size, origem)
+                    elif situacao == "erro":
+                        logger.warning("❌ XML ignorado: %s | %s", nome, mensagem)
+                        invalidos.add(nome)
+                    resultados[nome] = resultado
+                    feitos += 1
+                    medida["itens"] += 1
+                    medida["bytes_lidos"] += tamanho
+                    if progresso is not None:
+                        progresso("xml", feitos, total, None)
+                if rodada is not pendentes:
+                    pendentes += rodada
+
+                # O XML mantido não abriu: vale a próxima cópia descartada
+                rodada = []
+                for nome, mantido in _reservas_da_vez(reservas, invalidos).items():
+                    logger.info("♻️ %s não abriu, usando a cópia %s", mantido, nome)
+                    del reservas[nome]
+                    for outro in reservas:
+                        if reservas[outro] == mantido:
+                            reservas[outro] = nome
+                    arquivo = por_nome[nome]
+                    arquivos.append(arquivo)
+                    registro = em_cache.get(nome)
+                    if registro is not None and registro[:2] == arquivo[1:3]:
+                        resultados[nome] = registro[2:]
+                        do_cache += 1
+                    else:
+                        rodada.append(arquivo)
+                total += len(rodada)
+
+            for nome, _, _, _ in copias:
+                resultados[nome] = resultados[por_conteudo[nome]]
+                if por_conteudo[nome] in invalidos:
+                    invalidos.add(nome)
+            pendentes += copias
+
+        if con is not None:
+            presentes = {arquivo[0] for arquivo in todos}
+            with etapa(relatorio, "xml.gravar_cache") as medida:
+                try:
+                    gravar_cache(
+                        con,
+                        [(nome, marca, tamanho) + resultados[nome] for nome, marca, tamanho, _ in pendentes
+                         if resultados[nome] is not None],
+                        [nome for nome in em_cache if nome not in presentes or nome in invalidos],
+                    )
+                except sqlite3.Error as e:
+                    logger.warning("⚠️ Não foi possível atualizar o cache de XMLs: %s", e)
+                medida["itens"] += len(pendentes)
+    finally:
+        if con is not None:
+            con.close()
+        fechar_zips()
+
+    if progresso is not None:
+        progresso("xml", len(resultados), len(resultados), None)
+
+    debug = logger.isEnabledFor(logging.DEBUG)
+    ignorados = 0
+    cancelamentos = set()
+    arquivo_da_nota = {}
+    colisoes = []
+    for nome, _, _, _ in arquivos:
+        if resultados.get(nome) is None:
+            continue
+        chave, nota, raiz = resultados[nome]
+        if chave is None:
+            ignorados += 1
+            continue
+        if chaves is not None and chave not in chaves:
+            continue
+        if nota is None:
+            cancelamentos.add(chave)
+            continue
+        if debug:
+            _detalhar_nota(nome, chave, nota)
+        # Mesma chave em outro arquivo: vale a mesma preferência de
+        # duplicados_por_chave (nfeProc, NFe, o resto; empate, o último)
+        documento = por_conteudo.get(nome, nome)
+        preferencia = _PREFERENCIA_RAIZ.get(raiz, 0)
+        if chave in arquivo_da_nota and arquivo_da_nota[chave][0] != documento:
+            anterior, preferencia_anterior = arquivo_da_nota[chave]
+            if preferencia < preferencia_anterior:
+                descartado, mantido = documento, anterior
+            else:
+                descartado, mantido = anterior, documento
+            colisoes.append((descartado, mantido, "colisão"))
+            # Um CT-e que aponta para a NF-e não traz as duplicatas dela: só
+            # avisa quando as duas são NF-e
+            if notas[chave] != nota and min(preferencia, preferencia_anterior) > 0:
+                logger.warning("⚠️ Nota %s em %s e %s com dados diferentes; vale %s.",
+                               chave, anterior, documento, mantido)
+            if mantido == anterior:
+                continue
+        arquivo_da_nota[chave] = (documento, preferencia)
+        notas[chave] = nota
+    for chave in cancelamentos:
+        notas.pop(chave, None)
+    if canceladas is not None:
+        canceladas.update(cancelamentos)
+
+    logger.info(
+        "📄 %d XMLs lidos (%d do cache, %d parseados, %d fora do SPED, %d não são nota), %d notas.",
+        len(todos), do_cache, len(pendentes) - len(copias), fora, ignorados, len(notas),
+    )
+    pela_chave = [(nome, mantido, "chave") for nome, mantido in reservas.items() if nome in por_chave]
+    pelo_cabecalho = [(nome, mantido, "cabeçalho") for nome, mantido in reservas.items() if nome in por_cabecalho]
+    pelo_conteudo = [(nome, mantido, "conteúdo") for nome, mantido in por_conteudo.items()]
+    descartes = pela_chave + pelo_cabecalho + pelo_conteudo
+    if descartes:
+        logger.info("♻️ %d XMLs duplicados lidos uma vez só "
+                    "(%d pela chave, %d pelo cabeçalho, %d pelo conteúdo).",
+                    len(descartes), len(pela_chave), len(pelo_cabecalho), len(por_conteudo))
+    if colisoes:
+        logger.info("♻️ %d notas repetidas em arquivos diferentes; vale a NF-e autorizada.", len(colisoes))
+    descartes += colisoes
+    for nome, mantido, motivo in descartes:
+        logger.debug("♻️ %s: duplicado de %s (%s)", nome, mantido, motivo)
+    if duplicados is not None:
+        duplicados.extend(descartes)
+    if cancelamentos:
+        logger.info("🚫 %d notas com evento de cancelamento ficam sem duplicatas.", len(cancelamentos))
+    return notas
+
+
+def _detalhar_nota(arquivo, chave, nota):
+    logger.debug("📄 Processando XML: %s", arquivo)
+    logger.debug("➡️ Chave: %s", chave)
+    logger.debug("➡️ Número NF: %s", nota.numero)
+    if nota.emissao is not None:
+        logger.debug("➡️ Data emissão (dhEmi/dEmi): %s", nota.emissao)
+    else:
+        logger.debug("⚠️ Nenhuma data de emissão encontrada!")
+    duplicatas = nota.duplicatas
+    logger.debug("➡️ Duplicatas encontradas: %s", duplicatas if duplicatas else "Nenhuma")